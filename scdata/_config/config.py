@@ -6,9 +6,12 @@ from scdata.utils.meta import (get_paths, load_blueprints,
                                 load_calibrations, load_connectors,
                                 load_env, load_firmware_names)
 
-from os import pardir, environ
-from os.path import join, abspath, dirname, exists
+from os import pardir, environ, getpid, replace
+from os.path import join, abspath, dirname, exists, getmtime
 import sys
+from threading import Thread, Lock, get_ident
+from concurrent.futures import ThreadPoolExecutor
+from time import time
 
 from math import inf
 from numpy import arange, array
@@ -22,6 +25,12 @@ class Config(object):
     # Timestamp for log output
     _timestamp = True
 
+    # Structured log: file where the messages are appended as JSON lines (None to disable).
+    # Several processes can share it, i.e. to aggregate the logs of concurrent tasks
+    _log_json = None
+    # Output level for the JSON log, as _out_level
+    _log_json_level = 'NORMAL'
+
     # Framework option
     # For renderer plots and config files
     # Options:
@@ -67,11 +76,21 @@ class Config(object):
         # Whether or not to load or store cached data (saves time when requesting a lot of data)
         'load_cached_api': True,
         'store_cached_api': True,
+        # Format for cached data: 'csv', or 'parquet' and 'feather' (binary, need pyarrow)
+        'cache_format': 'csv',
+        # Partition cached data in one file per period ('D': day, 'M': month), so that only
+        # new partitions are written and only the requested ones are read. None for a single file
+        'cache_partition': None,
         # If reloading data from the API, how much gap between the saved data and the
         # latest reading in the API should be ignore
         'cached_data_margin': 1,
         # clean_na
-        'clean_na': None
+        'clean_na': None,
+        # Split API requests in time windows of this length (i.e. '30D'), requested
+        # concurrently and cached as they complete. None requests everything at once
+        'request_window': None,
+        # Devices loaded (threads) and processed (processes) at the same time in a Test
+        'workers': 1
     }
 
     # If using multiple training datasets, how to call the joint df
@@ -83,6 +102,45 @@ class Config(object):
     # Ignore duplicate sensor ids
     _sc_ignore_keys = ['DALLAS_TEMP', 'GB_TEMP', 'GB_HUM']
 
+    ### ---------------------------------------
+    ### -------------API REQUESTS--------------
+    ### ---------------------------------------
+
+    # Maximum number of requests in flight when requesting sensors concurrently
+    _max_concurrent_requests = 8
+    # Maximum number of chunks in flight when posting readings
+    _max_concurrent_posts = 4
+    # Seconds a failed post can be resumed from its record (same columns and dates)
+    _post_record_ttl = 86400
+    # Send several rows per request to NILU (needs the inbound endpoint to accept lists)
+    _nilu_batch_post = False
+    # Page sizes for paginated requests: SC API (per_page) and Socrata ($limit)
+    _sc_page_size = 100
+    _socrata_page_size = 50000
+    # Seconds the world maps (devices and stations) are kept in memory for repeated queries
+    _world_map_ttl = 3600
+    # Retries after an HTTP 429 (too many requests)
+    _max_retries = 1
+    # Seconds to wait before the first retry if the API does not send Retry-After.
+    # Doubled on each subsequent retry and shared by all the requests in flight
+    _retry_backoff = 30
+    # Requests per second to these API hosts, shared by all processes. Other hosts are not limited
+    _rate_limit = {'api.smartcitizen.me': 5}
+    # Requests that can be made at once after being idle
+    _rate_limit_burst = 10
+
+    # Connections kept alive per API host (at least _max_concurrent_requests).
+    # Raised when loading devices concurrently, to workers * _max_concurrent_requests
+    _http_pool_size = 10
+    # Timeout for the requests in seconds (connect, read)
+    _http_timeout = (10, 120)
+    # Retries on connection errors and server errors (5xx), not for POST or PATCH
+    _http_retries = 3
+    # Out of those, retries on connection errors (kept low, as they fail when offline)
+    _http_connect_retries = 1
+    # Backoff factor for those retries (0, 2x, 4x... seconds)
+    _http_retry_backoff = 0.5
+
     ### ---------------------------------------
     ### --------------ALGORITHMS---------------
     ### ---------------------------------------
@@ -93,6 +151,17 @@ class Config(object):
     # Plot out level (priority of the plot to show - 'DEBUG' or 'NORMAL')
     _plot_out_level = 'DEBUG'
 
+    # Maximum number of metrics processed concurrently in Device.process (1: in order).
+    # Opt-in: the processes are mostly pandas code holding the GIL. Use Test.process(workers)
+    # to process several devices at once instead
+    _max_process_workers = 1
+
+    # Columns read by process functions that are not in their args or kwargs,
+    # so that Device.process runs them after the metrics with that name
+    _process_implicit_deps = {
+        'alphasense_803_04': ['NO2'] # NO2 cross-sensitivity
+    }
+
     ### ---------------------------------------
     ### ----------------ZENODO-----------------
     ### ---------------------------------------
@@ -110,6 +179,22 @@ class Config(object):
     _base_postprocessing_url = 'https://raw.githubusercontent.com/fablabbcn/smartcitizen-data/master/'
     _default_file_type = 'json'
 
+    # Seconds the device metadata from the SC API is kept on disk (under paths['data']/metadata)
+    # and reused by later runs. Metadata includes last_reading_at, so it can be this late. 0 to disable
+    _device_json_ttl = 600
+
+    # Seconds the metadata (blueprints, calibrations, connectors and sensor names) in paths['interim']
+    # is used as is. Older files are still used, and refreshed in the background if data['reload_metadata']
+    _metadata_ttl = 86400
+
+    # Metadata loaded on first access: {attribute: (file in paths['interim'], loader, urls attribute)}
+    _metadata = {
+        'blueprints': ('blueprints.json', load_blueprints, 'blueprints_urls'),
+        'calibrations': ('calibrations.json', load_calibrations, 'calibrations_urls'),
+        'connectors': ('connectors.json', load_connectors, 'connectors_urls'),
+        'sc_sensor_names': ('names.json', load_firmware_names, 'sensor_names_url_21')
+    }
+
     calibrations_urls = [
         f'{_base_postprocessing_url}calibrations/calibrations.{_default_file_type}'
     ]
@@ -596,11 +681,17 @@ class Config(object):
 
     def __init__(self):
         self._env_file = False
+        self._metadata_lock = Lock()
+        self._metadata_refreshing = set()
         self.paths = get_paths()
         self.load()
-        self.get_meta_data()
+        self.load_env_file()
 
     def __getattr__(self, name):
+        # Metadata is loaded on first access
+        if name in Config._metadata:
+            self.get_meta_data([name])
+            if name in self.__dict__: return self.__dict__[name]
         try:
             return self[name]
         except KeyError:
@@ -617,58 +708,103 @@ class Config(object):
     def __iter__(self):
         return (i for i in dir(self))
 
-    def get_meta_data(self):
-        """ Get meta data from blueprints and _calibrations """
-
-        # (re)load calibrations
-        bppath = join(self.paths['interim'], 'blueprints.json')
-        if self.data['reload_metadata'] or not exists(bppath):
-            blueprints = load_blueprints(self.blueprints_urls)
-            bpreload = True
-        else:
-            with open(bppath, 'r') as file: blueprints = json.load(file)
-            bpreload = False
-
-        calpath = join(self.paths['interim'], 'calibrations.json')
-        if self.data['reload_metadata'] or not exists(calpath):
-            calibrations = load_calibrations(self.calibrations_urls)
-            calreload = True
-        else:
-            with open(calpath, 'r') as file: calibrations = json.load(file)
-            calreload = False
-
-        conpath = join(self.paths['interim'], 'connectors.json')
-        if self.data['reload_metadata'] or not exists(conpath):
-            connectors = load_connectors(self.connectors_urls)
-            conreload = True
-        else:
-            with open(conpath, 'r') as file: connectors = json.load(file)
-            conreload = False
-
-        namespath = join(self.paths['interim'], 'names.json')
-        if self.data['reload_metadata'] or not exists(namespath):
-            sc_sensor_names = load_firmware_names(self.sensor_names_url_21)
-            namesreload = True
-        else:
-            with open(namespath, 'r') as file: sc_sensor_names = json.load(file)
-            namesreload = False
-
-        if blueprints is not None:
-            self.blueprints = blueprints
-            if bpreload:
-                with open(bppath, 'w') as file: json.dump(blueprints, file)
-        if calibrations is not None:
-            self.calibrations = calibrations
-            if calreload:
-                with open(calpath, 'w') as file: json.dump(calibrations, file)
-        if connectors is not None:
-            self.connectors = connectors
-            if conreload:
-                with open(conpath, 'w') as file: json.dump(connectors, file)
-        if sc_sensor_names is not None:
-            self.sc_sensor_names = sc_sensor_names
-            if namesreload:
-                with open(namespath, 'w') as file: json.dump(sc_sensor_names, file)
+    def __metadata_path__(self, name):
+        return join(self.paths['interim'], Config._metadata[name][0])
+
+    @staticmethod
+    def __metadata_incomplete__(metadata):
+        # Any of the urls failed (i.e. offline)
+        return not metadata or any(value is None for value in metadata.values())
+
+    def __download_metadata__(self, name, complete = False):
+        """
+        Downloads metadata, keeps it and stores it in paths['interim']. Returns None if failed,
+        or if complete and any of the urls failed, so that the local files are kept.
+        Incomplete metadata is only kept in memory, so that it is downloaded again next time
+        """
+        _, loader, urls = Config._metadata[name]
+        metadata = loader(getattr(self, urls))
+        if metadata is None: return None
+        if Config.__metadata_incomplete__(metadata):
+            if complete: return None
+            print(f'Could not download all the {name}. Not storing them')
+            self.__dict__[name] = metadata
+            return metadata
+
+        self.__dict__[name] = metadata
+        # Write and rename, so that other processes never read half a file
+        path = self.__metadata_path__(name)
+        tmp = f'{path}.{getpid()}.{get_ident()}'
+        with open(tmp, 'w') as file: json.dump(metadata, file)
+        replace(tmp, path)
+
+        return metadata
+
+    def __refresh_metadata__(self, names):
+        def refresh(name):
+            try:
+                self.__download_metadata__(name, complete = True)
+            except:
+                print(f'Problem refreshing {name}')
+            finally:
+                with self._metadata_lock: self._metadata_refreshing.discard(name)
+
+        # All at once, as each of them is mostly waiting for the server (304 if not modified)
+        with ThreadPoolExecutor(max_workers = len(names)) as executor: list(executor.map(refresh, names))
+
+    def get_meta_data(self, names = None):
+        """
+        Get meta data from blueprints, calibrations, connectors and sensor names.
+        Files in paths['interim'] are used if present. If they are older than _metadata_ttl
+        and data['reload_metadata'], they are refreshed in the background. Missing files
+        are downloaded
+        Parameters
+        ----------
+            names: list
+                None
+                Metadata to get, all of them (Config._metadata) if None
+        Returns
+        ----------
+            None
+        """
+        if names is None: names = list(Config._metadata.keys())
+        stale = []
+        missing = []
+
+        with self._metadata_lock:
+            for name in names:
+                path = self.__metadata_path__(name)
+
+                if name not in self.__dict__:
+                    metadata = None
+                    if exists(path):
+                        try:
+                            with open(path, 'r') as file: metadata = json.load(file)
+                        except ValueError:
+                            print(f'Invalid {path}. Downloading it again')
+                        if metadata is not None and Config.__metadata_incomplete__(metadata):
+                            print(f'Incomplete {path}. Downloading it again')
+                            metadata = None
+
+                    if metadata is None:
+                        # Nothing to use meanwhile, so this one is not in the background
+                        missing.append(name)
+                        continue
+                    self.__dict__[name] = metadata
+
+                if self.data['reload_metadata'] and name not in self._metadata_refreshing:
+                    if exists(path) and time() - getmtime(path) > self._metadata_ttl: stale.append(name)
+
+            if missing:
+                with ThreadPoolExecutor(max_workers = len(missing)) as executor:
+                    list(executor.map(self.__download_metadata__, missing))
+
+            self._metadata_refreshing.update(stale)
+
+        if stale: Thread(target = self.__refresh_metadata__, args = (stale, ), daemon = True).start()
+
+    def load_env_file(self):
+        """ Load .env for tokens and stuff if found """
 
         # Find environment file in root or in scdata/ for clones
         if exists(join(self.paths['data'],'.env')):
@@ -697,6 +833,9 @@ class Config(object):
             for k, v in saved_config.items():
 
                 try:
+                    # Keep defaults for keys that are not in the saved file yet
+                    if isinstance(v, dict) and isinstance(getattr(self, k, None), dict):
+                        v = dict_fmerge(getattr(self, k), v)
                     self.__setattr__(k, v)
 
                 except KeyError:  # Ignore unrecognised data in config
@@ -1,16 +1,18 @@
 ''' Main implementation of class Device '''
 
 from scdata.utils import std_out, localise_date, dict_fmerge, get_units_convf
-from scdata.io import read_csv_file, export_csv_file
+from scdata.io import (read_csv_file, export_csv_file, read_columnar_file, export_columnar_file,
+                       read_partitioned_file)
 from scdata.utils import LazyCallable, url_checker, get_json_from_url
 from scdata._config import config
 from scdata.device.process import *
 
 from os.path import join, basename
 from urllib.parse import urlparse
-from pandas import DataFrame, to_timedelta
+from pandas import DataFrame, Series, to_timedelta
 from traceback import print_exc
 from numpy import nan
+from concurrent.futures import ThreadPoolExecutor
 
 class Device(object):
     ''' Main implementation of the device class '''
@@ -145,6 +147,16 @@ class Device(object):
         else:
             self.options['frequency'] = '1Min'
 
+        if 'request_window' in options.keys():
+            self.options['request_window'] = options['request_window']
+        else:
+            self.options['request_window'] = config.data['request_window']
+
+        if 'window_path' in options.keys():
+            self.options['window_path'] = options['window_path']
+        else:
+            self.options['window_path'] = None
+
     def load_postprocessing(self):
 
         if self.source != 'api': return None
@@ -261,6 +273,10 @@ class Device(object):
                 Default to device clean_na (from blueprint or test)
             options['frequency'] = frequency to load data at in pandas format
                 Default to device frequency (from blueprint or test) or '1Min'
+            options['request_window'] = split API requests in windows of this length (i.e. '30D')
+                Default to config.data['request_window']
+            options['window_path'] = directory to store completed windows in, to resume interrupted requests
+                Default to None
         path: String
             Default: None
             Path were the csv file is, if any. Normally not needed to be provided, only for internal usage
@@ -305,8 +321,18 @@ class Device(object):
                             # Override min loading date
                             self.options['min_date'] = hw_latest_postprocess
 
+                    # Windowed requests
+                    wkwargs = dict()
+                    if self.options['request_window'] is not None:
+                        if self.sources[self.source]['handler'] == 'ScApiDevice':
+                            wkwargs['window'] = self.options['request_window']
+                            wkwargs['window_path'] = self.options['window_path']
+                        else:
+                            std_out('Request windows are only supported for ScApiDevice. Ignoring', 'WARNING')
+
                     df = self.api_device.get_device_data(self.options['min_date'], self.options['max_date'],
-                                                         self.options['frequency'], self.options['clean_na'])
+                                                         self.options['frequency'], self.options['clean_na'],
+                                                         **wkwargs)
 
                     # API Device is not aware of other csv index data, so make it here
                     if 'csv' in self.sources and df is not None:
@@ -317,9 +343,24 @@ class Device(object):
 
                 else:
                     # Cached case
-                    self.readings = self.readings.combine_first(read_csv_file(join(path, str(self.id) + '.csv'),
-                                                                self.location, self.options['frequency'],
-                                                                self.options['clean_na'], self.sources['csv']['index']))
+                    cache_format = config.data['cache_format']
+                    if config.data['cache_partition'] is not None:
+                        # Only partitions overlapping the requested dates
+                        cached = read_partitioned_file(join(path, str(self.id)), self.location,
+                                                       self.options['frequency'], self.options['clean_na'],
+                                                       self.sources['csv']['index'],
+                                                       partition = config.data['cache_partition'],
+                                                       min_date = self.options['min_date'],
+                                                       max_date = self.options['max_date'])
+                    elif cache_format == 'csv':
+                        cached = read_csv_file(join(path, str(self.id) + '.csv'),
+                                               self.location, self.options['frequency'],
+                                               self.options['clean_na'], self.sources['csv']['index'])
+                    else:
+                        cached = read_columnar_file(join(path, f'{self.id}.{cache_format}'),
+                                                    self.location, self.options['frequency'],
+                                                    self.options['clean_na'])
+                    self.readings = self.readings.combine_first(cached)
 
         except FileNotFoundError:
             # Handle error
@@ -408,7 +449,7 @@ class Device(object):
         if remove_sensors != []: std_out(f'Removing sensors from device: {remove_sensors}', 'WARNING')
         for sensor_to_remove in remove_sensors: self.sensors.pop(sensor_to_remove, None)
 
-        std_out(f'Device sensors after removal: {list(self.sensors.keys())}')
+        std_out(lambda: f'Device sensors after removal: {list(self.sensors.keys())}')
 
     def __convert_names__(self):
         rename = dict()
@@ -424,19 +465,25 @@ class Device(object):
             for the readings but never chached like so.
         '''
         std_out('Checking if units need to be converted')
+        factors = dict()
         for sensor in self.sensors:
             factor = get_units_convf(sensor, from_units = self.sensors[sensor]['units'])
+            if factor != 1 and sensor in self.readings.columns: factors[sensor] = factor
 
-            if factor != 1:
-                self.readings.rename(columns={sensor: sensor + '_RAW'}, inplace=True)
-                self.readings.loc[:, sensor] = self.readings.loc[:, sensor + '_RAW']*factor
+        # All the converted channels at once, keeping the original ones as _RAW
+        if factors:
+            converted = self.readings[list(factors)].mul(Series(factors))
+            self.readings.rename(columns = {sensor: sensor + '_RAW' for sensor in factors}, inplace = True)
+            self.readings[list(factors)] = converted
         std_out('Units check done', 'SUCCESS')
 
     def process(self, only_new = False, lmetrics = None):
         '''
         Processes devices metrics, either added by the blueprint definition
         or the addition using Device.add_metric(). See help(Device.add_metric) for
-        more information about the definition of the metrics to be added
+        more information about the definition of the metrics to be added.
+        Metrics are processed in order, or concurrently if they do not depend on each
+        other and config._max_process_workers > 1 (opt-in)
 
         Parameters
         ----------
@@ -460,16 +507,16 @@ class Device(object):
             return process_ok
 
         std_out('---------------------------')
-        std_out(f'Processing device {self.id}')
+        std_out(lambda: f'Processing device {self.id}')
 
         if lmetrics is None: metrics = self.metrics
         else: metrics = dict([(key, self.metrics[key]) for key in lmetrics])
 
+        # Load the callables first
+        functs = dict()
         for metric in metrics:
-            std_out(f'Processing {metric}')
-
             if only_new and metric in self.readings:
-                std_out(f'Skipping. Already in device')
+                std_out(f'Skipping {metric}. Already in device')
                 continue
 
             # Check if the metric contains a custom from_list
@@ -479,27 +526,41 @@ class Device(object):
                 lazy_name = f"scdata.device.process.{metrics[metric]['process']}"
 
             try:
-                funct = LazyCallable(lazy_name)
+                functs[metric] = LazyCallable(lazy_name)
             except ModuleNotFoundError:
                 print_exc()
-                process_ok &= False
                 std_out('Problem adding lazy callable to metrics list', 'ERROR')
-                pass
                 return False
 
-            args, kwargs = list(), dict()
-            if 'args' in metrics[metric]: args = metrics[metric]['args']
-            if 'kwargs' in metrics[metric]: kwargs = metrics[metric]['kwargs']
-
-            try:
-                self.readings[metric] = funct(self.readings, *args, **kwargs)
-            except KeyError:
-                # print_exc()
-                std_out('Metric args not in dataframe', 'ERROR')
-                process_ok=False
-                pass
-
-            if metric in self.readings: process_ok &= True
+        if config._max_process_workers is None or config._max_process_workers <= 1:
+            for metric in functs:
+                std_out(lambda: f'Processing {metric}')
+                result = self.__process_metric__(metric, metrics[metric], functs[metric], self.readings)
+                if result is None: process_ok = False
+                else: self.readings[metric] = result
+        else:
+            # Independent metrics of each level run concurrently. Each one gets a shallow
+            # copy of the readings, and the results are merged back in dependency order
+            with ThreadPoolExecutor(max_workers = config._max_process_workers) as executor:
+                for level in self.__metrics_levels__(metrics, list(functs.keys())):
+                    futures = dict()
+                    for metric in level:
+                        std_out(lambda: f'Processing {metric}')
+                        readings = self.readings.copy(deep = False)
+                        futures[metric] = (readings, executor.submit(self.__process_metric__, metric,
+                                                                     metrics[metric], functs[metric], readings))
+
+                    for metric in level:
+                        readings, future = futures[metric]
+                        result = future.result()
+                        if result is None:
+                            process_ok = False
+                            continue
+
+                        # Keep any auxiliary column added by the process
+                        for column in readings.columns.difference(self.readings.columns):
+                            self.readings[column] = readings[column]
+                        self.readings[metric] = result
 
         if process_ok:
             # Latest postprocessing to latest readings
@@ -518,6 +579,60 @@ class Device(object):
 
         return process_ok
 
+    def __process_metric__(self, metric, definition, funct, readings):
+        '''
+            Runs the process of a metric on the readings. Returns its result, or None
+            if it failed, so that the rest of the metrics are processed anyway
+        '''
+        args, kwargs = list(), dict()
+        if 'args' in definition: args = definition['args']
+        if 'kwargs' in definition: kwargs = definition['kwargs']
+
+        try:
+            return funct(readings, *args, **kwargs)
+        except KeyError:
+            # print_exc()
+            std_out(f'Metric args not in dataframe for {metric}', 'ERROR')
+        except:
+            print_exc()
+            std_out(f'Problem processing {metric}', 'ERROR')
+        return None
+
+    def __metrics_levels__(self, metrics, names):
+        '''
+            Sorts the metrics in levels based on the columns they read (args, kwargs
+            and config._process_implicit_deps). Each level only depends on the previous ones.
+            Metrics in a cycle are left in a last level each, in the original order
+        '''
+
+        def references(item):
+            if isinstance(item, str): return {item}
+            if isinstance(item, dict): item = list(item.values())
+            if isinstance(item, (list, tuple, set)):
+                return set().union(*[references(i) for i in item])
+            return set()
+
+        deps = dict()
+        for metric in names:
+            refs = references(metrics[metric].get('args', list()))
+            refs |= references(metrics[metric].get('kwargs', dict()))
+            if 'process' in metrics[metric]:
+                refs |= set(config._process_implicit_deps.get(metrics[metric]['process'], list()))
+            deps[metric] = [name for name in names if name in refs and name != metric]
+
+        levels, done, pending = list(), set(), list(names)
+        while pending:
+            level = [metric for metric in pending if all(dep in done for dep in deps[metric])]
+            if not level:
+                std_out(f'Circular dependencies in metrics {pending}, processing them in order', 'WARNING')
+                levels.extend([[metric] for metric in pending])
+                break
+            levels.append(level)
+            done.update(level)
+            pending = [metric for metric in pending if metric not in done]
+
+        return levels
+
     def forward(self, chunk_size = 500, dry_run = False):
         '''
             Forwards data to another api
@@ -631,7 +746,7 @@ class Device(object):
                 Force data export in case of already existing file
             file_format: String
                 'csv'
-                File format to export. Current supported format CSV
+                File format to export. Current supported formats: 'csv', 'parquet' and 'feather'
         Returns
         ---------
             True if exported ok, False otherwise
@@ -639,6 +754,9 @@ class Device(object):
         # Export device
         if file_format == 'csv':
             return export_csv_file(path, str(self.id), self.readings, forced_overwrite = forced_overwrite)
+        elif file_format in ['parquet', 'feather']:
+            return export_columnar_file(path, str(self.id), self.readings, forced_overwrite = forced_overwrite,
+                                        file_format = file_format)
         else:
             std_out('Not supported format' ,'ERROR')
             return False
@@ -2,8 +2,24 @@ from scdata.utils import std_out, get_units_convf, find_dates, localise_date
 from scdata._config import config
 from scdata.device.process import baseline_calc, clean_ts
 from scipy.stats.stats import linregress
-import matplotlib.pyplot as plt
-from pandas import date_range, DataFrame, Series, isnull
+from pandas import date_range, DataFrame, Series
+from numpy import interp
+
+def comp_t(t, comp_lut):
+    '''
+    Temperature correction factor from AAN803-04, linearly interpolated in
+    config._as_t_comp and saturated outside of it. NaN temperatures give NaN
+    Parameters
+    ----------
+        t: pandas.Series
+            Temperature (degC)
+        comp_lut: list
+            Correction factors for each temperature in config._as_t_comp
+    Returns
+    -------
+        pandas.Series with the correction factor
+    '''
+    return Series(interp(t, config._as_t_comp, comp_lut), index = t.index)
 
 def alphasense_803_04(dataframe, **kwargs):
     """
@@ -34,24 +50,6 @@ def alphasense_803_04(dataframe, **kwargs):
         calculation of pollutant in ppb
     """
 
-    def comp_t(x, comp_lut):
-        if isnull(x['t']): return None
-
-        # Below min temperature, we saturate
-        if x['t'] < config._as_t_comp[0]: return comp_lut[0]
-
-        # Over max temperature, we saturate
-        if x['t'] > config._as_t_comp[-1]: return comp_lut[-1]
-
-        # Otherwise, we calculate
-        idx_2 = next(axis[0] for axis in enumerate(config._as_t_comp) if axis[1] > x['t'])
-        idx_1 = idx_2 - 1
-
-        delta_y = comp_lut[idx_2] - comp_lut[idx_1]
-        delta_x = config._as_t_comp[idx_2] - config._as_t_comp[idx_1]
-
-        return comp_lut[idx_1] + (x['t'] - config._as_t_comp[idx_1]) * delta_y / delta_x
-
     # Check inputs
     flag_error = False
     if 'we' not in kwargs: flag_error = True
@@ -131,8 +129,8 @@ def alphasense_803_04(dataframe, **kwargs):
     # Get requested temperature
     df['t'] = df[kwargs['t']]
 
-    # Temperature compensation - done line by line as it has special conditions
-    df[comp_type] = df.apply(lambda x: comp_t(x, comp_lut), axis = 1) # temperature correction factor
+    # Temperature compensation
+    df[comp_type] = comp_t(df['t'], comp_lut) # temperature correction factor
 
     # Algorithm selection (result in V)
     if algorithm == 1:
@@ -1,17 +1,17 @@
-from numpy import ones, transpose, log
+from numpy import ones, zeros, transpose, log, asarray, array_equal
 from scipy.stats.stats import linregress
 from scipy.sparse import (diags, spdiags)
 from scipy.sparse.linalg import spsolve
-from pandas import date_range
+from scipy.linalg import solveh_banded, LinAlgError
+from functools import lru_cache
+from pandas import date_range, Series
 from numpy import min as npmin
 from numpy import max as npmax
 from numpy import abs as npabs
-from numpy import argmax, argmin, arange, exp
+from numpy import argmax, argmin, arange, exp, fmin, fmax, full, nan, isnan, minimum
 from scdata.utils import std_out
 from scdata._config import config
-from math import isnan
 from .formulae import exp_f
-import matplotlib.pyplot as plt
 from re import search
 
 def find_min_max(min_max, iterable = list()):
@@ -71,29 +71,107 @@ def get_delta_baseline(series, **kwargs):
     # result = result.resample(resample).mean()
 
     pdates = date_range(start = result.index[0], end = result.index[-1], freq = f'{delta}Min')
+    nbins = len(pdates) - 1
+    if nbins < 1: return result
+
+    # Each window is [pdates[i], pdates[i+1]], both ends included, and the
+    # points in it take its min (max). The point on a window edge ends up
+    # with the value of the window starting on it. Points after the last edge
+    # are left as they are. The index is assumed to be sorted and unique
+    values = series.values.astype(float)
+    start = series.index.searchsorted(pdates, side = 'left')
+    end = series.index.searchsorted(pdates[1:], side = 'right')
+    bins = pdates.searchsorted(series.index, side = 'right') - 1
+    inbins = bins < nbins
+
+    if btype == 'min': reduce, freduce = 'min', fmin
+    elif btype == 'max': reduce, freduce = 'max', fmax
+    else: return result
+
+    # Window values without the right edge
+    window = Series(values[inbins]).groupby(bins[inbins]).agg(reduce)
+    window = window.reindex(arange(nbins)).values
+
+    # Add the right edge, if it is in the index
+    has_edge = end > start[1:]
+    edge = full(nbins, nan)
+    edge[has_edge] = values[start[1:][has_edge]]
+    window = freduce(window, edge)
+
+    # As with min()/max() on the values, a window starting with NaN gives NaN
+    empty = start[:-1] == end
+    first = values[minimum(start[:-1], len(values) - 1)]
+    window[isnan(first) & ~empty] = nan
+    window[empty] = 0
+
+    baseline = values.copy()
+    baseline[inbins] = window[bins[inbins]]
+    # The last edge belongs to the last window
+    if has_edge[-1]: baseline[start[-1]] = window[-1]
+
+    result[:] = baseline
 
-    for pos in range(0, len(pdates)-1):
-        chunk = series[pdates[pos]:pdates[pos+1]]
-        
-        if len(chunk.values) == 0: result[pdates[pos]:pdates[pos+1]] = 0
-        else: 
-            if btype == 'min': result[pdates[pos]:pdates[pos+1]] = min(chunk.values)
-            elif btype == 'max': result[pdates[pos]:pdates[pos+1]] = max(chunk.values)
-    
     return result
 
-def get_als_baseline(series, lambd = 1e5, p = 0.01, n_iter=10):
-
-    L = len(series)
+@lru_cache(maxsize = 8)
+def __als_penalty_bands__(L):
+    # Upper bands of the (symmetric, pentadiagonal) D·Dᵀ in solveh_banded format.
+    # Only depends on the length, so it is cached. Do not modify the result
     D = diags([1,-2,1],[0,-1,-2], shape=(L,L-2))
-    w = ones(L)
+    DDt = D.dot(D.transpose())
+    bands = zeros((3, L))
+    for k in range(3): bands[2-k, k:] = DDt.diagonal(k)
+    return bands
+
+def get_als_baseline(series, lambd = 1e5, p = 0.01, n_iter = 10, weights = None, return_weights = False):
+    """
+    Asymmetric least squares baseline. The system W + lambd·D·Dᵀ is solved
+    with a banded Cholesky solver, stopping early if the weights do not change
+    Parameters
+    ----------
+        series: pd.Series or np.array
+            The timeseries to be baselined
+        lambd: float
+            1e5
+            Smoothness
+        p: float
+            0.01
+            Asymmetry
+        n_iter: int
+            10
+            Maximum number of iterations
+        weights: np.array
+            None
+            Initial weights (i.e. from a previous lambd). None starts with ones
+        return_weights: boolean
+            False
+            Return the final weights as well, to warm start the next call
+    Returns
+    -------
+        Baseline (and weights if return_weights)
+    """
+
+    y = asarray(series, dtype = float)
+    L = len(y)
+    bands = lambd * __als_penalty_bands__(L)
+
+    if weights is None: w = ones(L)
+    else: w = asarray(weights, dtype = float).copy()
 
     for i in range(n_iter):
-        W = spdiags(w, 0, L, L)
-        Z = W + lambd * D.dot(D.transpose())
-        z = spsolve(Z, w*series)
-        w = p * (series > z) + (1-p) * (series < z)
-    
+        ab = bands.copy()
+        ab[2] += w
+        try:
+            z = solveh_banded(ab, w*y, check_finite = False)
+        except LinAlgError:
+            # Not positive definite (i.e. too few non-zero weights)
+            D = diags([1,-2,1],[0,-1,-2], shape=(L,L-2))
+            z = spsolve(spdiags(w, 0, L, L) + lambd * D.dot(D.transpose()), w*y)
+        w_new = p * (y > z) + (1-p) * (y < z)
+        if array_equal(w_new, w): break
+        w = w_new
+
+    if return_weights: return z, w
     return z
 
 # TODO DOCUMENT
@@ -128,6 +206,8 @@ def baseline_calc(dataframe, **kwargs):
     if result.empty: return None
 
     if config._intermediate_plots and config._plot_out_level == 'DEBUG': 
+        # Only for debugging, not loaded otherwise
+        import matplotlib.pyplot as plt
         fig, ax = plt.subplots(figsize=(12,8))
 
     if baseline_type == 'deltas':
@@ -170,11 +250,14 @@ def baseline_calc(dataframe, **kwargs):
         else: p = kwargs['p']
 
         l_iter = lambdas
+        # Weights from the previous lambda are a good starting point for the next one
+        weights = None
 
         for lambd in lambdas:
 
-            name_lambda = name +'_' +str(lambd)
-            result[name_lambda] = get_als_baseline(result.loc[:,target_name], lambd, p)
+            name_lambda = target_name +'_' +str(lambd)
+            result[name_lambda], weights = get_als_baseline(result.loc[:,target_name], lambd, p,
+                                                            weights = weights, return_weights = True)
 
             if config._intermediate_plots and config._plot_out_level == 'DEBUG': 
                 ax.plot(result.index, result[name_lambda], label = name_lambda)
@@ -1,9 +1,9 @@
-from geopy.distance import distance
-from math import isnan
+from scdata.utils import within_circle
 
 def is_within_circle(x, within, _lat_name = 'GPS_LAT', _long_name = 'GPS_LONG'):
     ''' 
-    Returns whether or not a line in pd.DataFrame() is geolocated within a circle
+    Returns whether or not a line in pd.DataFrame() is geolocated within a circle.
+    For whole dataframes, use scdata.utils.within_circle on the columns instead
     Parameters
     ----------
         within: tuple
@@ -18,10 +18,7 @@ def is_within_circle(x, within, _lat_name = 'GPS_LAT', _long_name = 'GPS_LONG'):
             Column name for long in dataframe
     Returns
     -------
-        pandas series containing bool defining wether or not each dataframe[:, [lat_name, long_name]] are within circle of basepoint(lat, long)
+        bool defining wether or not x[lat_name, long_name] is within circle of basepoint(lat, long)
     '''
 
-    if isnan(x[_lat_name]): return False
-    if isnan(x[_long_name]): return False
-
-    return distance((within[0], within[1]), (x[_lat_name], x[_long_name])).m < within[2]
\ No newline at end of file
+    return bool(within_circle(x[_lat_name], x[_long_name], within))
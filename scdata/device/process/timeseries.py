@@ -1,5 +1,6 @@
 from numpy import nan, full, power, ones
-from scdata.device.process import is_within_circle
+from scdata.utils import within_circle
+from pandas import Series
 
 def poly_ts(dataframe, **kwargs):
     """
@@ -223,13 +224,12 @@ def geo_located(dataframe, **kwargs):
         pandas series containing bool defining wether or not each dataframe[:, [lat_name, long_name]] are within circle of basepoint(lat, long)
     """
 
-    result = dataframe.copy()
-
     if 'within' not in kwargs: return None
 
     if 'lat_name' not in kwargs: lat_name = 'GPS_LAT'
+    else: lat_name = kwargs['lat_name']
     if 'long_name' not in kwargs: long_name = 'GPS_LONG'
+    else: long_name = kwargs['long_name']
 
-    result['within'] = result.apply(lambda x: is_within_circle(x, kwargs['within'], lat_name, long_name), axis=1)
-
-    return result['within']
\ No newline at end of file
+    return Series(within_circle(dataframe[lat_name], dataframe[long_name], kwargs['within']),
+                  index = dataframe.index, name = 'within')
\ No newline at end of file
@@ -1,3 +1,5 @@
 from .csv import read_csv_file, export_csv_file, sdcard_concat
+from .columnar import read_columnar_file, export_columnar_file
+from .partitions import read_partitioned_file, export_partitioned_file
 from .firmware import get_firmware_names
 from .model import model_load, model_export
\ No newline at end of file
@@ -0,0 +1,112 @@
+from os import makedirs
+from os.path import exists, join, splitext
+from scdata.utils import std_out, localise_date, clean
+from pandas import read_parquet
+from pandas.tseries.frequencies import to_offset
+
+# Binary columnar formats. They keep the tz-aware index and column dtypes,
+# so reloading them does not need parsing text again
+columnar_formats = ['parquet', 'feather']
+
+def export_columnar_file(path, file_name, df, forced_overwrite = False, file_format = 'parquet', verbose = True):
+    '''
+    Exports pandas dataframe to a binary columnar file (parquet or feather)
+    Parameters
+    ----------
+        path: String
+            Directory path
+        file_name: String
+            File name for the resulting file, without extension
+        df: pandas.DataFrame
+            Dataframe to export
+        forced_overwrite: boolean
+            False
+            If file exists, overwrite it or not
+        file_format: String
+            'parquet'
+            'parquet' or 'feather'
+        verbose: boolean
+            True
+            Log the saved file
+    Returns
+    ---------
+        True if exported, False if not (if file exists returns False)
+    '''
+
+    if file_format not in columnar_formats:
+        std_out(f'Not supported format {file_format}', 'ERROR')
+        return False
+
+    # If path does not exist, create it
+    if not exists(path):
+        makedirs(path)
+
+    file_path = join(path, f'{file_name}.{file_format}')
+
+    if exists(file_path) and not forced_overwrite:
+        std_out("File Already exists - delete it first, I was not asked to overwrite anything!", 'ERROR')
+        return False
+
+    try:
+        if file_format == 'parquet':
+            df.to_parquet(file_path)
+        elif file_format == 'feather':
+            from pyarrow import feather
+            # Feather does not store the index, keep it as first column
+            feather.write_feather(df.reset_index(), file_path)
+    except ImportError:
+        std_out(f'pyarrow is needed to export {file_format} files', 'ERROR')
+        return False
+
+    if verbose: std_out(f'File saved to: \n{file_path}', 'SUCCESS')
+    return True
+
+def read_columnar_file(file_path, location, frequency, clean_na = None):
+    """
+    Reads a binary columnar file (parquet or feather), memory mapping it, and puts it into
+    a pandas dataframe. Resampling is only done if the stored frequency is not the requested one
+    Parameters
+    ----------
+        file_path: String
+            File path. The format is taken from the extension (.parquet or .feather)
+        location: String
+            Time zone for the file
+        frequency: String
+            Frequency to resample to, in pandas format
+        clean_na: String or None
+            None
+            Whether to perform clean_na or not. Either None, 'fill' or 'drop'
+    Returns
+    -------
+        Pandas dataframe
+    """
+
+    file_format = splitext(file_path)[1][1:]
+    if file_format not in columnar_formats:
+        std_out(f'Not supported format {file_format}', 'ERROR')
+        return None
+
+    if not exists(file_path): raise FileNotFoundError(file_path)
+
+    try:
+        if file_format == 'parquet':
+            df = read_parquet(file_path, memory_map = True)
+        elif file_format == 'feather':
+            from pyarrow import feather
+            df = feather.read_feather(file_path, memory_map = True)
+            df = df.set_index(df.columns[0])
+    except ImportError:
+        std_out(f'pyarrow is needed to read {file_format} files', 'ERROR')
+        return None
+
+    # Index is stored tz-aware, this only converts it
+    df.index = localise_date(df.index, location)
+
+    # Resample only if needed
+    if df.index.inferred_freq is None or to_offset(df.index.inferred_freq) != to_offset(frequency):
+        df = df.resample(frequency).mean()
+
+    # Remove na
+    df = clean(df, clean_na, how = 'all')
+
+    return df
@@ -4,7 +4,7 @@ from scdata.utils import std_out, localise_date, clean
 from pandas import read_csv, to_datetime, to_numeric, option_context, DataFrame
 import csv
 
-def export_csv_file(path, file_name, df, forced_overwrite = False):
+def export_csv_file(path, file_name, df, forced_overwrite = False, verbose = True):
     '''
     Exports pandas dataframe to a csv file
     Parameters
@@ -18,6 +18,9 @@ def export_csv_file(path, file_name, df, forced_overwrite = False):
         forced_overwrite: boolean
             False
             If file exists, overwrite it or not
+        verbose: boolean
+            True
+            Log the saved file
     Returns
     ---------
         True if exported, False if not (if file exists returns False)
@@ -30,7 +33,7 @@ def export_csv_file(path, file_name, df, forced_overwrite = False):
     # If file does not exist 
     if not exists(path + '/' + str(file_name) + '.csv') or forced_overwrite:
         df.to_csv(path + '/' + str(file_name) + '.csv', sep=",")
-        std_out('File saved to: \n' + path + '/' + str(file_name) +  '.csv', 'SUCCESS')
+        if verbose: std_out('File saved to: \n' + path + '/' + str(file_name) +  '.csv', 'SUCCESS')
     else:
         std_out("File Already exists - delete it first, I was not asked to overwrite anything!", 'ERROR')
         return False
@@ -136,7 +139,7 @@ def sdcard_concat(path, output = 'CONCAT.CSV', index_name = 'TIME', keep = True,
 
     for file in listdir(path):
         if file != output and file != ignore:
-            std_out(f'Loading file: {file}')
+            std_out(lambda: f'Loading file: {file}')
             filename, _ = splitext(file)
             src_path = join(path, file)
 
@@ -1,28 +1,57 @@
 from pandas import (DataFrame, to_datetime, to_numeric, to_timedelta,
-                    to_numeric, read_csv, DateOffset, MultiIndex)
+                    to_numeric, read_csv, MultiIndex, concat)
+from pandas.errors import EmptyDataError
 
-from math import isnan
+from numpy import isnan, char, datetime_as_string
 from traceback import print_exc
-from requests import get, post, patch
 from re import search
 from io import StringIO
 
-from geopy.distance import distance
 from scdata._config import config
-from scdata.utils import std_out, localise_date, clean, get_elevation, url_checker
+from scdata.utils import (std_out, localise_date, clean, get_elevation, url_checker,
+                          retry_get, retry_post, split_dates, GeoIndex)
+from scdata.utils.http import get, post, patch
+from scdata.io.csv import read_csv_file, export_csv_file
 from tzwhere import tzwhere
 from datetime import date, datetime
-from os import environ, urandom
-from json import dumps
+from os import environ, urandom, makedirs, remove, replace, getpid
+from json import dumps, dump, load
+# orjson is optional, only used to serialise faster the payloads to post
+try:
+    from orjson import dumps as fast_dumps
+except ImportError:
+    fast_dumps = dumps
 
 import binascii
-from time import sleep
+from threading import get_ident
+from time import time
+from math import ceil
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from os.path import join, exists, dirname, getmtime
+from shutil import rmtree
 
 import sys
-from tqdm import trange
+from tqdm import tqdm
 
 tz_where = tzwhere.tzwhere(forceTZ=True)
 
+# World map snapshots and their spatial index, per API: {api: (time, df, GeoIndex)}
+_world_maps = dict()
+
+def _world_map_snapshot(api, fetch, lat_name, long_name, update = False):
+    '''
+        Returns the cached world map and spatial index of api, calling fetch() to get
+        the world map dataframe if it is not cached or older than config._world_map_ttl
+    '''
+    if update or api not in _world_maps or time() - _world_maps[api][0] > config._world_map_ttl:
+        df = fetch()
+        if df is None or df.empty:
+            std_out(f'Empty world map from {api}', 'ERROR')
+            return None, None
+        _world_maps[api] = (time(), df, GeoIndex(df, lat_name, long_name))
+
+    return _world_maps[api][1], _world_maps[api][2]
+
 '''
 About the classes in this file:
 Each of the object interacts with a separate API.
@@ -132,6 +161,45 @@ class ScApiDevice:
         std_out(f'Error while creating new device, platform returned {backed_device.status_code}', 'ERROR')
         return False
 
+    @staticmethod
+    def __get_pages__(url):
+        '''
+            Gets all the pages of a list endpoint of the SC API. The first page gives
+            the total (if the API reports it), and the rest are fetched concurrently
+        '''
+        per_page = config._sc_page_size
+        sep = '&' if '?' in url else '?'
+        page_url = lambda page: f'{url}{sep}page={page}&per_page={per_page}'
+
+        response = retry_get(page_url(1))
+        if not (response.status_code == 200 or response.status_code == 201):
+            std_out('API reported {}'.format(response.status_code), 'ERROR')
+            return None
+
+        items = response.json()
+        if len(items) < per_page: return items
+
+        if 'Total' in response.headers:
+            pages = -(-int(response.headers['Total']) // per_page)
+            with ThreadPoolExecutor(max_workers = config._max_concurrent_requests) as executor:
+                for presponse in executor.map(lambda page: retry_get(page_url(page)), range(2, pages + 1)):
+                    if not (presponse.status_code == 200 or presponse.status_code == 201):
+                        std_out('API reported {}'.format(presponse.status_code), 'ERROR')
+                        return None
+                    items += presponse.json()
+        else:
+            # Without total, until a page is not full
+            page = 1
+            while len(items) == page * per_page:
+                page += 1
+                presponse = retry_get(page_url(page))
+                if not (presponse.status_code == 200 or presponse.status_code == 201):
+                    std_out('API reported {}'.format(presponse.status_code), 'ERROR')
+                    return None
+                items += presponse.json()
+
+        return items
+
     @staticmethod
     def global_search(value = None, full = False):
         """
@@ -160,16 +228,13 @@ class ScApiDevice:
         query = API_BASE_URL  + f'{value}'
 
         try:
-            qresp = get(query)
-
-            # If status code OK, retrieve data
-            if qresp.status_code == 200 or qresp.status_code == 201:
-                df = DataFrame(qresp.json()).set_index('id')
-            else:
-                std_out('API reported {}'.format(qresp.status_code), 'ERROR')
+            # All the pages of results
+            items = ScApiDevice.__get_pages__(query)
+            if items is None: return None
+            df = DataFrame(items).set_index('id')
         except:
             std_out('Failed request. Probably no connection', 'ERROR')
-            pass
+            return None
 
         if full: return df
         else: return list(df.index)
@@ -210,22 +275,20 @@ class ScApiDevice:
              query = API_BASE_URL  + f'?q[{key}]={value}'
 
         try:
-            qresp = get(query)
-
-            # If status code OK, retrieve data
-            if qresp.status_code == 200 or qresp.status_code == 201:
-                df = DataFrame(qresp.json()).set_index('id')
-            else:
-                std_out('API reported {}'.format(qresp.status_code), 'ERROR')
+            # All the pages of results
+            items = ScApiDevice.__get_pages__(query)
+            if items is None: return None
+            df = DataFrame(items).set_index('id')
         except:
             std_out('Failed request. Probably no connection', 'ERROR')
-            pass
+            return None
 
         if full: return df
         else: return list(df.index)
 
     @staticmethod
-    def get_world_map(min_date = None, max_date = None, city = None, within = None, tags = None, tag_method = 'any', full = False):
+    def get_world_map(min_date = None, max_date = None, city = None, within = None, tags = None, tag_method = 'any', full = False,
+                      update = False):
         """
         Gets devices from Smart Citizen API with certain requirements
         Parameters
@@ -252,32 +315,28 @@ class ScApiDevice:
             full: bool
                 False
                 Returns a list with if False, or the whole dataframe if True
+            update: bool
+                False
+                Download the world map again, even if the cached one is recent
         Returns
         -------
             A list of kit IDs that comply with the requirements, or the full df, depending on full.
             If no requirements are set, returns all of them
         """
 
-        def is_within_circle(x, within):
-            if isnan(x['latitude']): return False
-            if isnan(x['longitude']): return False
-
-            return distance((within[0], within[1]), (x['latitude'], x['longitude'])).m<within[2]
+        df, index = ScApiDevice.get_world_map_index(update)
+        if df is None: return None
 
-        world_map = get('https://api.smartcitizen.me/v0/devices/world_map')
-
-        df = DataFrame(world_map.json()).set_index('id')
+        # Location, first as it uses the spatial index (adds the distance in m)
+        if within is not None: df = index.within(*within)
+        else: df = df.copy()
 
         # Filter out dates
         if min_date is not None: df=df[(min_date > df['added_at'])]
         if max_date is not None: df=df[(max_date < df['last_reading_at'])]
 
-        # Location
+        # City
         if city is not None: df=df[(df['city']==city)]
-        if within is not None:
-
-            df['within'] = df.apply(lambda x: is_within_circle(x, within), axis=1)
-            df=df[(df['within']==True)]
 
         # Tags
         if tags is not None:
@@ -290,37 +349,80 @@ class ScApiDevice:
         if full: return df
         else: return list(df.index)
 
-    def get_mac(self, update = False):
-        if self.mac is None or update:
-            std_out(f'Requesting MAC from API for device {self.id}')
-            # Get device
+    @staticmethod
+    def get_world_map_index(update = False):
+        '''
+            Gets the SC world map, cached for config._world_map_ttl, and a spatial index over it
+            (scdata.utils.GeoIndex) for radius, bbox and nearest devices queries
+            Parameters
+            ----------
+                update: bool
+                    False
+                    Download the world map again, even if the cached one is recent
+            Returns
+            -------
+                World map dataframe and its GeoIndex
+        '''
+        def fetch():
             try:
-                deviceR = get(self.API_BASE_URL + '{}/'.format(self.id))
-
-                # If status code OK, retrieve data
-                if deviceR.status_code == 200 or deviceR.status_code == 201:
-                    if 'hardware_info' in deviceR.json().keys(): self.mac = deviceR.json()['hardware_info']['mac']
-                    std_out ('Device {} is has this MAC {}'.format(self.id, self.mac))
-                else:
-                    std_out('API reported {}'.format(deviceR.status_code), 'ERROR')
+                response = retry_get('https://api.smartcitizen.me/v0/devices/world_map')
+                if response.status_code == 200 or response.status_code == 201:
+                    df = DataFrame(response.json())
+                    if df.empty: return None
+                    return df.set_index('id')
+                std_out('API reported {}'.format(response.status_code), 'ERROR')
             except:
                 std_out('Failed request. Probably no connection', 'ERROR')
-                pass
+            return None
+
+        return _world_map_snapshot('sc', fetch, 'latitude', 'longitude', update)
+
+    def get_mac(self, update = False):
+        if self.mac is None or update:
+            std_out(f'Requesting MAC from API for device {self.id}')
+            if self.get_device_json(update) is not None:
+                if 'hardware_info' in self.devicejson.keys(): self.mac = self.devicejson['hardware_info']['mac']
+                std_out ('Device {} is has this MAC {}'.format(self.id, self.mac))
 
         return self.mac
 
+    def __json_cache_path__(self):
+        return join(config.paths['data'], 'metadata', f'sc_device_{self.id}.json')
+
+    def __clear_json_cache__(self):
+        if exists(self.__json_cache_path__()): remove(self.__json_cache_path__())
+
     def get_device_json(self, update = False):
+        '''
+            Gets the device JSON from the API, from which all the other device
+            metadata is taken. Unless update, it is only requested once, and reused
+            from the disk cache if it is more recent than config._device_json_ttl
+        '''
         if self.devicejson is None or update:
+            cache_path = self.__json_cache_path__()
+
+            if not update and config._device_json_ttl and exists(cache_path):
+                if time() - getmtime(cache_path) < config._device_json_ttl:
+                    try:
+                        with open(cache_path, 'r') as file: self.devicejson = load(file)
+                        std_out(f'Device {self.id} metadata loaded from cache')
+                        return self.devicejson
+                    except:
+                        std_out('Invalid cached metadata, requesting it', 'WARNING')
+                        pass
+
             try:
-                deviceR = get(self.API_BASE_URL + '{}/'.format(self.id))
-                if deviceR.status_code == 429:
-                    std_out('API reported {}. Retrying once'.format(deviceR.status_code),
-                            'WARNING')
-                    sleep(30)
-                    deviceR = get(self.API_BASE_URL + '{}/'.format(self.id))
+                deviceR = retry_get(self.API_BASE_URL + '{}/'.format(self.id))
 
                 if deviceR.status_code == 200 or deviceR.status_code == 201:
                     self.devicejson = deviceR.json()
+
+                    if config._device_json_ttl:
+                        # Written aside and replaced, so that concurrent loads never read half a file
+                        makedirs(dirname(cache_path), exist_ok = True)
+                        tmp = f'{cache_path}.{getpid()}.{get_ident()}'
+                        with open(tmp, 'w') as file: dump(self.devicejson, file)
+                        replace(tmp, cache_path)
                 else:
                     std_out('API reported {}'.format(deviceR.status_code), 'ERROR')
             except:
@@ -357,6 +459,7 @@ class ScApiDevice:
 
             if response.status_code == 200 or response.status_code == 201:
                 std_out(f'Kit ID for device {self.id} was updated to {self.kit_id}', 'SUCCESS')
+                self.__clear_json_cache__()
                 return True
 
         std_out(f'Problem while updating kit ID for device {self.id}')
@@ -490,7 +593,37 @@ class ScApiDevice:
         rollup = rollup_value + rollup_unit
         return rollup
 
-    def get_device_data(self, min_date = None, max_date = None, frequency = '1Min', clean_na = None):
+    def get_device_data(self, min_date = None, max_date = None, frequency = '1Min', clean_na = None,
+                        window = None, window_path = None):
+        '''
+            Requests the device data from the SC API
+            Parameters
+            ----------
+                min_date: String or datetime
+                    None
+                    Date to request data from
+                max_date: String or datetime
+                    None
+                    Date to request data to
+                frequency: String
+                    '1Min'
+                    Frequency to request data at, in pandas format
+                clean_na: String
+                    None
+                    'drop', 'fill' or None
+                window: String
+                    None
+                    If not None, splits the request in time windows of this length
+                    (timedelta format, i.e. '30D') that are requested concurrently
+                window_path: String
+                    None
+                    Directory in which each completed window is stored, so that an
+                    interrupted request resumes from the windows already downloaded.
+                    Windows are deleted once the full request succeeds
+            Returns
+            -------
+                pandas DataFrame with the data
+        '''
 
         if 'SC_ADMIN_BEARER' in environ:
             std_out('Admin Bearer found, using it', 'SUCCESS')
@@ -506,7 +639,11 @@ class ScApiDevice:
         rollup = self.convert_rollup(frequency)
         std_out(f'Using rollup: {rollup}')
 
-        # Make sure we have the everything we need beforehand
+        # Make sure we have the everything we need beforehand.
+        # All of it comes from the same device json
+        if self.get_device_json() is None:
+            std_out('Cannot get device information, skipping', 'WARNING')
+            return None
         self.get_device_sensors()
         self.get_device_timezone()
         self.get_device_last_reading()
@@ -539,86 +676,167 @@ class ScApiDevice:
             return None
         else: std_out(f'Sensor IDs: {list(self.sensors.keys())}')
 
-        df = DataFrame()
+        # Split the request in time windows if requested
+        windows = [(min_date, max_date)]
+        if window is not None:
+            wmin = localise_date(min_date, 'UTC')
+            # Avoid requesting windows before the device existed
+            if self.added_at is not None: wmin = max(wmin, localise_date(self.added_at, 'UTC'))
+            if max_date is not None: wmax = localise_date(max_date, 'UTC')
+            elif self.last_reading_at is not None: wmax = localise_date(self.last_reading_at, 'UTC')
+            else: wmax = None
+
+            if wmax is None or wmin >= wmax:
+                std_out('Cannot split request in windows without a valid date range', 'WARNING')
+            else:
+                windows = [(start.strftime('%Y-%m-%dT%H:%M:%S'), end.strftime('%Y-%m-%dT%H:%M:%S'))
+                           for start, end in split_dates(wmin, wmax, window)]
+                std_out(lambda: f'Requesting data in {len(windows)} windows of {window}')
+                if window_path is not None: window_path = join(window_path, f'{self.id}_windows')
 
-        # Get devices in the sensor first
-        for sensor_id in self.sensors.keys():
+        dfwindows = dict()
+        dfsensors = dict([(w, list()) for w in windows])
+        flag_error = False
 
-            # Request sensor per ID
-            request = self.API_BASE_URL + '{}/readings?'.format(self.id)
+        # Request all sensors (and windows) concurrently
+        with ThreadPoolExecutor(max_workers = config._max_concurrent_requests) as executor:
+            futures = dict()
+            for w in windows:
+                # Resume from the windows already downloaded
+                wfile = join(window_path, f'{self.__window_name__(w)}.csv') if window_path is not None else None
+                if wfile is not None and exists(wfile):
+                    std_out(lambda: f'Loading window {w[0]} - {w[1]} from {window_path}')
+                    dfwindows[w] = read_csv_file(wfile, self.timezone, frequency, index_name = 'TIME')
+                    if dfwindows[w] is not None: continue
+
+                for sensor_id in self.sensors.keys():
+                    futures[executor.submit(self.get_sensor_data, sensor_id, w[0], w[1],
+                                            rollup, frequency, headers)] = w
+
+            for future in as_completed(futures):
+                w = futures[future]
+                dfsensors[w].append(future.result())
+                if len(dfsensors[w]) < len(self.sensors): continue
+
+                # All sensors for this window are in
+                wflag_error = any([dfsensor is None for dfsensor in dfsensors[w]])
+                dfwindows[w] = self.__merge_sensors__(dfsensors[w])
+                flag_error |= wflag_error
+                if window_path is not None and len(windows) > 1 and not wflag_error:
+                    export_csv_file(window_path, self.__window_name__(w), dfwindows[w], forced_overwrite = True)
+
+        # Put windows back together in order
+        dfwindows = [dfwindows[w] for w in windows if w in dfwindows and not dfwindows[w].empty]
+        if dfwindows:
+            df = concat(dfwindows).sort_index()
+            df = df[~df.index.duplicated(keep='first')].sort_index(axis = 1)
+        else: df = DataFrame()
+
+        # Completed windows are not needed anymore
+        if window_path is not None and len(windows) > 1 and not flag_error and exists(window_path):
+            rmtree(window_path)
 
-            if min_date is not None: request += f'from={min_date}'
-            if max_date is not None: request += f'&to={max_date}'
+        try:
+            df = df.reindex(df.index.rename('TIME'))
+            df = clean(df, clean_na, how = 'all')
+            self.data = df
 
-            request += f'&rollup={rollup}'
-            request += f'&sensor_id={sensor_id}'
-            request += '&function=avg'
+        except:
+            std_out('Problem closing up the API dataframe', 'ERROR')
+            pass
+            return None
 
-            # Make request
-            sensor_req = get(request, headers = headers)
+        if flag_error == False: std_out(f'Device {self.id} loaded successfully from API', 'SUCCESS')
+        return self.data
 
-            # Retry once in case of 429 after 30s
-            if sensor_req.status_code == 429:
-                std_out('Too many requests, waiting for 1 more retry', 'WARNING')
-                sleep (30)
-                sensor_req = get(request, headers = headers)
+    @staticmethod
+    def __window_name__(window):
+        return f"{window[0].replace(':', '')}_{window[1].replace(':', '')}"
 
-            flag_error = False
-            try:
-                sensorjson = sensor_req.json()
-            except:
-                std_out(f'Problem with json data from API, {sensor_req.status_code}', 'ERROR')
-                flag_error = True
-                pass
-                continue
+    @staticmethod
+    def __merge_sensors__(dfsensors):
+        # Single aligned merge of all the sensors
+        dfsensors = [dfsensor for dfsensor in dfsensors if dfsensor is not None and not dfsensor.empty]
+        if not dfsensors: return DataFrame()
+        return concat(dfsensors, axis = 1).sort_index().sort_index(axis = 1).rename_axis('TIME')
 
-            if 'readings' not in sensorjson.keys():
-                std_out(f'No readings key in request for sensor: {sensor_id}', 'ERROR')
-                flag_error = True
-                continue
+    def get_sensor_data(self, sensor_id, min_date, max_date, rollup, frequency = '1Min', headers = None):
+        '''
+            Requests the readings of one sensor from the SC API
+            Parameters
+            ----------
+                sensor_id: int
+                    Sensor ID in the platform (key of self.sensors)
+                min_date: String
+                    Date in API format (%Y-%m-%dT%H:%M:%S) to request data from
+                max_date: String
+                    Date in API format (%Y-%m-%dT%H:%M:%S) to request data to. None if up to the last reading
+                rollup: String
+                    Rollup in API format (see convert_rollup)
+                frequency: String
+                    '1Min'
+                    Frequency to resample the data to, in pandas format
+                headers: dict
+                    None
+                    Headers for the request
+            Returns
+            -------
+                pandas DataFrame with one column named as the sensor (empty if there is no data),
+                or None if the request failed
+        '''
 
-            elif sensorjson['readings'] == []:
-                std_out(f'No data in request for sensor: {sensor_id}', 'WARNING')
-                flag_error = True
-                continue
+        # Request sensor per ID
+        request = self.API_BASE_URL + '{}/readings?'.format(self.id)
 
-            if flag_error: continue
+        if min_date is not None: request += f'from={min_date}'
+        if max_date is not None: request += f'&to={max_date}'
 
-            try:
-                dfsensor = DataFrame(sensorjson['readings']).set_index(0)
-                dfsensor.columns = [self.sensors[sensor_id]]
-                # dfsensor.index = to_datetime(dfsensor.index).tz_localize('UTC').tz_convert(self.timezone)
-                dfsensor.index = localise_date(dfsensor.index, self.timezone)
-                dfsensor.sort_index(inplace=True)
-                dfsensor = dfsensor[~dfsensor.index.duplicated(keep='first')]
-
-                # Drop unnecessary columns
-                dfsensor.drop([i for i in dfsensor.columns if 'Unnamed' in i], axis=1, inplace=True)
-                # Check for weird things in the data
-                dfsensor = dfsensor.astype(float, errors='ignore')
-                # dfsensor = dfsensor.apply(to_numeric, errors='coerce')
-                # Resample
-                dfsensor = dfsensor.resample(frequency).mean()
-                df = df.combine_first(dfsensor)
-            except:
-                print_exc()
-                std_out('Problem with sensor data from API', 'ERROR')
-                flag_error = True
-                pass
-                continue
+        request += f'&rollup={rollup}'
+        request += f'&sensor_id={sensor_id}'
+        request += '&function=avg'
 
-            try:
-                df = df.reindex(df.index.rename('TIME'))
-                df = clean(df, clean_na, how = 'all')
-                self.data = df
+        # Make request, with shared backoff in case of 429
+        try:
+            sensor_req = retry_get(request, headers = headers)
+        except:
+            std_out(f'Failed request for sensor {sensor_id}. Probably no connection', 'ERROR')
+            return None
 
-            except:
-                std_out('Problem closing up the API dataframe', 'ERROR')
-                pass
-                return None
+        try:
+            sensorjson = sensor_req.json()
+        except:
+            std_out(f'Problem with json data from API, {sensor_req.status_code}', 'ERROR')
+            return None
 
-        if flag_error == False: std_out(f'Device {self.id} loaded successfully from API', 'SUCCESS')
-        return self.data
+        if 'readings' not in sensorjson.keys():
+            std_out(f'No readings key in request for sensor: {sensor_id}', 'ERROR')
+            return None
+
+        elif sensorjson['readings'] == []:
+            std_out(f'No data in request for sensor: {sensor_id}', 'WARNING')
+            return DataFrame()
+
+        try:
+            dfsensor = DataFrame(sensorjson['readings']).set_index(0)
+            dfsensor.columns = [self.sensors[sensor_id]]
+            # dfsensor.index = to_datetime(dfsensor.index).tz_localize('UTC').tz_convert(self.timezone)
+            dfsensor.index = localise_date(dfsensor.index, self.timezone)
+            dfsensor.sort_index(inplace=True)
+            dfsensor = dfsensor[~dfsensor.index.duplicated(keep='first')]
+
+            # Drop unnecessary columns
+            dfsensor.drop([i for i in dfsensor.columns if 'Unnamed' in i], axis=1, inplace=True)
+            # Check for weird things in the data
+            dfsensor = dfsensor.astype(float, errors='ignore')
+            # dfsensor = dfsensor.apply(to_numeric, errors='coerce')
+            # Resample
+            dfsensor = dfsensor.resample(frequency).mean()
+        except:
+            print_exc()
+            std_out('Problem with sensor data from API', 'ERROR')
+            return None
+
+        return dfsensor
 
     def post_device_data(self, clean_na = 'drop', chunk_size = 500):
         '''
@@ -659,7 +877,10 @@ class ScApiDevice:
 
     def post_data_to_device(self, df, clean_na = 'drop', chunk_size = 500, dry_run = False):
         '''
-            POST external pandas.DataFrame to the SmartCitizen API
+            POST external pandas.DataFrame to the SmartCitizen API.
+            Chunks are posted concurrently (config._max_concurrent_posts), retrying on 429 and 5xx.
+            If the post fails, the last timestamp posted is recorded, and posting the same columns
+            from the same start date again (within config._post_record_ttl) resumes from there
             Parameters
             ----------
                 df: pandas DataFrame
@@ -692,45 +913,134 @@ class ScApiDevice:
         headers = {'Authorization':'Bearer ' + bearer, 'Content-type': 'application/json'}
 
         # Clean df of nans
-        df = clean(df, clean_na, how = 'all')
+        df = clean(df, clean_na, how = 'all').sort_index()
         df.index.name = 'recorded_at'
 
+        if df.empty:
+            std_out('Nothing to post', 'WARNING')
+            return True
+
+        if dry_run:
+            # Nothing is read from or written to the post record
+            std_out(f'Dry run request to: {self.API_BASE_URL}{self.id}/readings for chunk (1/{ceil(df.shape[0]/chunk_size)})')
+            return dumps(self.__readings_payload__(df[:chunk_size]), indent = 2)
+
+        # Resume from a previous post of the same columns and start date that did not finish.
+        # The end date can be later (i.e. the same post, run again with newer data)
+        columns = [str(column) for column in df.columns]
+        start = localise_date(df.index[0], 'UTC').isoformat()
+        record = self.__load_post_record__()
+        if record is not None:
+            if record.get('columns') == columns and record.get('start') == start \
+                and time() - record.get('updated', 0) < config._post_record_ttl:
+                last_posted = localise_date(record['last_posted'], 'UTC')
+                std_out(f'Resuming post for {self.id} after {last_posted}', 'WARNING')
+                df = df[localise_date(df.index, 'UTC') > last_posted]
+            else:
+                # From another post, or too old to trust
+                std_out(f'Discarding previous post record for {self.id}')
+                self.__save_post_record__(None)
+
+        if df.empty:
+            std_out('Nothing to post', 'WARNING')
+            self.__save_post_record__(None)
+            return True
+
         # Split the dataframe in chunks
-        std_out(f'Splitting post in chunks of size {chunk_size}')
+        std_out(lambda: f'Splitting post in chunks of size {chunk_size}')
         chunked_dfs = [df[i:i+chunk_size] for i in range(0, df.shape[0], chunk_size)]
 
-        for i in trange(len(chunked_dfs), file=sys.stdout,
-                        desc=f"Posting data for {self.id}..."):
+        failed = False
+
+        def post_chunk(i):
+            # Do not start new chunks once one has failed
+            if failed: return None
+
+            response = retry_post(f'{self.API_BASE_URL}{self.id}/readings',
+                                  data = fast_dumps(self.__readings_payload__(chunked_dfs[i])),
+                                  headers = headers)
+            return response.status_code
+
+        # Chunks are posted concurrently, but only the chunks up to the first
+        # one not posted count as done for resuming
+        posted = [False] * len(chunked_dfs)
+        done = 0
+
+        with ThreadPoolExecutor(max_workers = config._max_concurrent_posts) as executor:
+            futures = {executor.submit(post_chunk, i): i for i in range(len(chunked_dfs))}
+
+            for future in tqdm(as_completed(futures), total = len(futures), file = sys.stdout,
+                               desc = f"Posting data for {self.id}..."):
+                i = futures[future]
+                try:
+                    status_code = future.result()
+                except:
+                    print_exc()
+                    status_code = None
+
+                if status_code == 200 or status_code == 201:
+                    posted[i] = True
+                    while done < len(posted) and posted[done]: done += 1
+                    if done: self.__save_post_record__(chunked_dfs[done-1].index[-1], columns, start)
+                    continue
 
-            chunk = chunked_dfs[i].copy()
+                if status_code is not None:
+                    std_out(f'Chunk ({i+1}/{len(chunked_dfs)}) post failed. API responded {status_code}', 'ERROR')
+                failed = True
 
-            # Prepare json post
-            payload = {"data":[]}
-            for item in chunk.index:
-                payload["data"].append(
-                    {
-                        "recorded_at": localise_date(item, 'UTC').strftime('%Y-%m-%dT%H:%M:%SZ'),
-                        "sensors": [{
-                            "id": column,
-                            "value": chunk.loc[item, column]
-                        } for column in chunk.columns if not isnan(chunk.loc[item, column])]
-                    }
-                )
+        if failed or done < len(chunked_dfs):
+            std_out(f'Posted {done}/{len(chunked_dfs)} chunks. Run again to resume', 'ERROR')
+            return False
 
-            if dry_run:
-                std_out(f'Dry run request to: {self.API_BASE_URL}{self.id}/readings for chunk ({i+1}/{len(chunked_dfs)})')
-                return dumps(payload, indent = 2)
+        self.__save_post_record__(None)
+        return True
 
-            response = post(f'{self.API_BASE_URL}{self.id}/readings',
-                            data = dumps(payload), headers = headers)
+    def __post_record_path__(self):
+        return join(config.paths['data'], 'metadata', f'sc_device_{self.id}_post.json')
 
-            if not(response.status_code == 200 or response.status_code == 201):
+    def __load_post_record__(self):
+        if not exists(self.__post_record_path__()): return None
+        try:
+            with open(self.__post_record_path__(), 'r') as file: return load(file)
+        except:
+            return None
 
-                std_out (f'Chunk ({i+1}/{len(chunked_dfs)}) post failed. \
-                           API responded {response.status_code}', 'ERROR')
-                return False
+    def __save_post_record__(self, last_posted, columns = None, start = None):
+        '''
+            Records the last timestamp posted, with the columns and the start
+            date of the post, or deletes the record if None
+        '''
+        record_path = self.__post_record_path__()
+        if last_posted is None:
+            if exists(record_path): remove(record_path)
+            return
 
-        return True
+        if not exists(dirname(record_path)): makedirs(dirname(record_path))
+        with open(record_path, 'w') as file:
+            dump({'last_posted': localise_date(last_posted, 'UTC').isoformat(),
+                  'columns': columns,
+                  'start': start,
+                  'updated': time()}, file)
+
+    @staticmethod
+    def __readings_payload__(chunk):
+        '''
+            Readings payload for the SC API: one item per timestamp, with the
+            non NaN values of each column as sensors
+        '''
+        # Timestamps formatted at once (as '%Y-%m-%dT%H:%M:%SZ'), values and NaN mask as numpy arrays
+        timestamps = char.add(datetime_as_string(localise_date(chunk.index, 'UTC').values, unit = 's'), 'Z')
+        values = chunk.values.astype(float)
+        valid = ~isnan(values)
+        columns = list(chunk.columns)
+
+        return {"data": [
+                    {
+                        "recorded_at": timestamp,
+                        "sensors": [{"id": column, "value": value}
+                                    for column, value, ok in zip(columns, row, rvalid) if ok]
+                    } for timestamp, row, rvalid in zip(timestamps.tolist(), values.tolist(), valid.tolist())
+                ]}
 
     def patch_postprocessing(self, dry_run = False):
         '''
@@ -765,6 +1075,7 @@ class ScApiDevice:
 
         if response.status_code == 200 or response.status_code == 201:
             std_out(f"Postprocessing posted", "SUCCESS")
+            self.__clear_json_cache__()
             return True
         else:
             std_out(f"API responded with {response.status_code}")
@@ -850,6 +1161,52 @@ class DadesObertesApiDevice:
 
     API_BASE_URL="https://analisi.transparenciacatalunya.cat/resource/uy6k-2s8r.csv?"
 
+    # Station metadata columns, for the world map
+    STATION_COLUMNS = ['codi_eoi', 'municipi', 'latitud', 'longitud', 'tipus_est', 'rea_urb']
+
+    @staticmethod
+    def __get_csv_pages__(request, order = ':id'):
+        '''
+            Gets all the rows of a Socrata csv request, in pages of config._socrata_page_size
+            ($limit/$offset) fetched concurrently, ordered by order so that pages are stable.
+            Each page is parsed as it is streamed. Returns None if any page fails
+        '''
+        limit = config._socrata_page_size
+        sep = '' if request.endswith('?') else '&'
+
+        def get_page(page):
+            response = retry_get(f'{request}{sep}$order={order}&$limit={limit}&$offset={page*limit}', stream = True)
+            if not (response.status_code == 200 or response.status_code == 201):
+                std_out('API reported {}'.format(response.status_code), 'ERROR')
+                return None
+            response.raw.decode_content = True
+            try:
+                return read_csv(response.raw)
+            except EmptyDataError:
+                return DataFrame()
+            finally:
+                response.close()
+
+        # First page alone, as most requests fit in it
+        first = get_page(0)
+        if first is None: return None
+        pages, page, last = [first], 1, len(first) < limit
+
+        # Then batches of pages, until one of them is not full
+        with ThreadPoolExecutor(max_workers = config._max_concurrent_requests) as executor:
+            while not last:
+                batch = list(executor.map(get_page, range(page, page + config._max_concurrent_requests)))
+                if any(dfp is None for dfp in batch): return None
+                for dfp in batch:
+                    if last: break
+                    pages.append(dfp)
+                    if len(dfp) < limit: last = True
+                page += config._max_concurrent_requests
+
+        pages = [dfp for dfp in pages if not dfp.empty]
+        if not pages: return DataFrame()
+        return concat(pages, ignore_index = True)
+
     def __init__ (self, did = None, within = None):
         if did is None and within is None:
             std_out('Specify either station id (=codi_eoi) or within (=(lat, long, radius_meters))')
@@ -867,7 +1224,7 @@ class DadesObertesApiDevice:
         self.timezone = None
 
     @staticmethod
-    def get_world_map(city = None, within = None, station_type = None, area_type = None):
+    def get_world_map(city = None, within = None, station_type = None, area_type = None, update = False):
         """
         Gets devices from Dades Obertes API with certain requirements
         Parameters
@@ -885,25 +1242,19 @@ class DadesObertesApiDevice:
             area_type: string
                 None
                 Type of area, to choose from:  nan, 'peri-urban', 'rural', 'suburban', 'urban'
+            update: bool
+                False
+                Download the stations again, even if the cached ones are recent
         Returns
         -------
             A list of eoi codes that comply with the requirements. If no requirements are set, returns all of them
         """
-        def is_within_circle(x, within):
-            if isnan(x['latitud']): return False
-            if isnan(x['longitud']): return False
-
-            return distance(location_A=(within[0], within[1]), location_B=(x['latitude'], x['longitude'])).m < within[2]
-
-        world_map = get("https://analisi.transparenciacatalunya.cat/resource/uy6k-2s8r.csv?")
-        df = read_csv(StringIO(world_map.content.decode('utf-8'))).set_index('codi_eoi')
+        df, index = DadesObertesApiDevice.get_world_map_index(update)
+        if df is None: return None
 
         # Location
+        if within is not None: df = index.within(*within)
         if city is not None: df=df[(df['municipi']==city)]
-        if within is not None:
-
-            df['within'] = df.apply(lambda x: is_within_circle(x, within), axis=1)
-            df=df[(df['within']==True)]
 
         # Station type
         if station_type is not None: df=df[(df['tipus_est']==station_type)]
@@ -912,6 +1263,60 @@ class DadesObertesApiDevice:
 
         return list(set(list(df.index)))
 
+    @staticmethod
+    def get_world_map_index(update = False):
+        '''
+            Gets the Dades Obertes stations, cached for config._world_map_ttl, and a spatial index
+            over them (scdata.utils.GeoIndex) for radius, bbox and nearest station queries
+            Parameters
+            ----------
+                update: bool
+                    False
+                    Download the stations again, even if the cached ones are recent
+            Returns
+            -------
+                Stations dataframe and its GeoIndex
+        '''
+        def fetch():
+            # Only the distinct station metadata, not the measurements
+            columns = ','.join(DadesObertesApiDevice.STATION_COLUMNS)
+            request = f'{DadesObertesApiDevice.API_BASE_URL}$select={columns}&$group={columns}'
+            try:
+                df = DadesObertesApiDevice.__get_csv_pages__(request, order = 'codi_eoi')
+            except:
+                print_exc()
+                std_out('Problem with request from API', 'ERROR')
+                return None
+            if df is None or df.empty: return None
+            return df.set_index('codi_eoi')
+
+        return _world_map_snapshot('dades_obertes', fetch, 'latitud', 'longitud', update)
+
+    @staticmethod
+    def get_nearest_stations(lat, long, k = 1, update = False):
+        '''
+            Gets the k reference stations nearest to a location
+            Parameters
+            ----------
+                lat: float
+                    Latitude
+                long: float
+                    Longitude
+                k: int
+                    1
+                    Number of stations
+                update: bool
+                    False
+                    Download the stations again, even if the cached ones are recent
+            Returns
+            -------
+                Dataframe with the stations, and their distance in m, closest first
+        '''
+        _, index = DadesObertesApiDevice.get_world_map_index(update)
+        if index is None: return None
+
+        return index.nearest(lat, long, k)
+
     def get_id_from_within(self, within):
         '''
             Gets the stations within a radius in meters.
@@ -1048,19 +1453,14 @@ class DadesObertesApiDevice:
             request += "&$where=data < " + to_datetime(max_date).strftime("'%Y-%m-%dT%H:%M:%S'")
 
         try:
-            s = get(request)
+            df = self.__get_csv_pages__(request)
         except:
             print_exc()
             std_out('Problem with sensor data from API', 'ERROR')
             pass
             return None
 
-        if s.status_code == 200 or s.status_code == 201:
-            df = read_csv(StringIO(s.content.decode('utf-8')))
-        else:
-            std_out('API reported {}'.format(s.status_code), 'ERROR')
-            pass
-            return None
+        if df is None: return None
 
         # Filter columns
         measures = ['h0' + str(i) for i in range(1,10)]
@@ -1080,20 +1480,21 @@ class DadesObertesApiDevice:
         else:
             std_out('Successful filtering', 'SUCCESS')
 
-        # Pivot
+        # Pivot: all contaminants and hours at once, one column per contaminant
         try:
-            df = DataFrame([])
+            contaminants = [contaminant for contaminant in self.sensors.keys()
+                            if contaminant in df_subset['contaminant'].values]
             for contaminant in self.sensors.keys():
-                if contaminant not in df_subset['contaminant'].values:
-                    std_out(f'{contaminant} not in columns. Skipping', 'WARNING')
-                    continue
-                df_temp= df_subset.loc[df_subset['contaminant']==contaminant].drop('contaminant', 1).set_index('date').unstack().reset_index()
-                df_temp.columns = ['hours', 'date', contaminant]
-                df_temp['date'] = to_datetime(df_temp['date'])
-                timestamp_lambda = lambda x: x['date'] + DateOffset(hours=int(x['hours']))
-                df_temp['date'] = df_temp.apply( timestamp_lambda, axis=1)
-                df_temp = df_temp.set_index('date')
-                df[contaminant] = df_temp[contaminant]
+                if contaminant not in contaminants: std_out(f'{contaminant} not in columns. Skipping', 'WARNING')
+
+            df_melt = df_subset[df_subset['contaminant'].isin(contaminants)].melt(id_vars = ['contaminant', 'date'],
+                                                                                 var_name = 'hours')
+            df_melt['date'] = to_datetime(df_melt['date']) + to_timedelta(df_melt['hours'].astype(int), unit = 'h')
+            df_melt = df_melt.drop_duplicates(subset = ['date', 'contaminant'], keep = 'first')
+
+            df = df_melt.set_index(['date', 'contaminant'])['value'].unstack('contaminant')
+            df = df.reindex(columns = contaminants)
+            df.columns.name = None
         except:
             # print_exc()
             std_out('Problem while filtering columns', 'Error')
@@ -1372,12 +1773,7 @@ class NiluApiDevice(object):
 
         if self.devicejson is None or update:
             try:
-                deviceR = get(f'{self.API_BASE_URL}sensors/{self.id}')
-                if deviceR.status_code == 429:
-                    std_out('API reported {}. Retrying once'.format(deviceR.status_code),
-                            'WARNING')
-                    sleep(30)
-                    deviceR = get(f'{self.API_BASE_URL}sensors/{self.id}', headers = headers)
+                deviceR = retry_get(f'{self.API_BASE_URL}sensors/{self.id}', headers = headers)
 
                 if deviceR.status_code == 200 or deviceR.status_code == 201:
                     self.devicejson = deviceR.json()
@@ -1413,12 +1809,7 @@ class NiluApiDevice(object):
 
         if self.last_reading_at is None or update:
             try:
-                deviceR = get(f'{self.API_BASE_URL}data/id/{self.id}/maxutc', headers = headers)
-                if deviceR.status_code == 429:
-                    std_out('API reported {}. Retrying once'.format(deviceR.status_code),
-                            'WARNING')
-                    sleep(30)
-                    deviceR = get(f'{self.API_BASE_URL}data/id/{self.id}/maxutc', headers = headers)
+                deviceR = retry_get(f'{self.API_BASE_URL}data/id/{self.id}/maxutc', headers = headers)
 
                 if deviceR.status_code == 200 or deviceR.status_code == 201:
                     last_json = deviceR.json()
@@ -1519,14 +1910,8 @@ class NiluApiDevice(object):
         if min_date is not None: request += f'fromutc/{min_date}/'
         if max_date is not None: request += f'toutc/{max_date}'
 
-        # Make request
-        sensor_req = get(request, headers = headers)
-
-        # Retry once in case of 429 after 30s
-        if sensor_req.status_code == 429:
-            std_out('Too many requests, waiting for 1 more retry', 'WARNING')
-            sleep (30)
-            sensor_req = get(request, headers = headers)
+        # Make request, with shared backoff in case of 429
+        sensor_req = retry_get(request, headers = headers)
 
         df = DataFrame(sensor_req.json()).pivot(index='timestamp_from_epoch', columns='component', values='value')
         df.columns.name = None
@@ -1556,6 +1941,8 @@ class NiluApiDevice(object):
         '''
             POST external data in the IFLINK API, following
             https://sensors.nilu.no/api/doc#push--sensor-data-by-id
+            Rows are posted concurrently (config._max_concurrent_posts) over the pooled connection.
+            If config._nilu_batch_post, chunk_size rows are sent per request, as a list
             Parameters
             ----------
                 df: pandas DataFrame
@@ -1566,8 +1953,9 @@ class NiluApiDevice(object):
                 clean_na: string, optional
                     'drop'
                     'drop', 'fill'
-                chunk_size: None (not used?)
-                    chunk size to split resulting pandas DataFrame for posting readings
+                chunk_size: int
+                    None
+                    Rows per request, only if config._nilu_batch_post. Otherwise one row per request
                 dry_run: boolean
                     False
                     Post the payload to the API or just return it
@@ -1585,33 +1973,57 @@ class NiluApiDevice(object):
         # Clean df of nans
         df = clean(df, clean_na, how = 'all')
 
-        # Split the dataframe in chunks
-        std_out(f'Splitting post in chunks of size {chunk_size}')
-        # chunked_dfs = [df[i:i+chunk_size] for i in range(0, df.shape[0], chunk_size)]
-
-        for i in trange(len(df.index), file=sys.stdout,
-                        desc=f"Posting data for {self.id}..."):
-
-            # chunk = chunked_dfs[i].copy()
-            row = DataFrame(df.loc[df.index[i],:]).T
-            # Prepare json post
-            payload = {}
-            payload['date'] = localise_date(df.index[i], 'UTC').strftime('%Y-%m-%dT%H:%M:%SZ')
-
-            for column in row.columns:
-                payload[column] = row.loc[df.index[i], column]
-
-            if dry_run:
-                std_out(f'Dry run request to: {self.API_BASE_URL}sensors/{self.id}/inbound')
-                return dumps(payload, indent = 2)
+        if df.empty:
+            std_out('Nothing to post', 'WARNING')
+            return True
 
-            response = post(f'{self.API_BASE_URL}sensors/{self.id}/inbound',
-                            data = dumps(payload), headers = headers)
+        # Prepare json post for all rows at once, without NaN values
+        dates = char.add(datetime_as_string(localise_date(df.index, 'UTC').values, unit = 's'), 'Z')
+        values = df.values.astype(float)
+        valid = ~isnan(values)
+        columns = list(df.columns)
+
+        payloads = list()
+        for timestamp, row, rvalid in zip(dates.tolist(), values.tolist(), valid.tolist()):
+            payload = {'date': timestamp}
+            payload.update({column: value for column, value, ok in zip(columns, row, rvalid) if ok})
+            payloads.append(payload)
+
+        if config._nilu_batch_post and chunk_size is not None and chunk_size > 1:
+            std_out(lambda: f'Splitting post in chunks of size {chunk_size}')
+            requests = [payloads[i:i+chunk_size] for i in range(0, len(payloads), chunk_size)]
+        else:
+            requests = payloads
 
-            if not(response.status_code == 200 or response.status_code == 201):
+        if dry_run:
+            std_out(f'Dry run request to: {self.API_BASE_URL}sensors/{self.id}/inbound')
+            return dumps(requests[0], indent = 2)
+
+        failed = False
+
+        def post_request(i):
+            # Do not start new requests once one has failed
+            if failed: return None
+            return retry_post(f'{self.API_BASE_URL}sensors/{self.id}/inbound',
+                              data = fast_dumps(requests[i]), headers = headers)
+
+        with ThreadPoolExecutor(max_workers = config._max_concurrent_posts) as executor:
+            futures = {executor.submit(post_request, i): i for i in range(len(requests))}
+
+            for future in tqdm(as_completed(futures), total = len(futures), file = sys.stdout,
+                               desc = f"Posting data for {self.id}..."):
+                i = futures[future]
+                try:
+                    response = future.result()
+                except:
+                    print_exc()
+                    failed = True
+                    continue
 
-                std_out (f'Chunk ({i+1}/{len(chunked_dfs)}) post failed. \
-                           API responded {response.status_code}:\n{response.json()}', 'ERROR')
-                return False
+                if response is None: continue
+                if not(response.status_code == 200 or response.status_code == 201):
+                    std_out (f'Request ({i+1}/{len(requests)}) post failed. \
+                               API responded {response.status_code}:\n{response.text}', 'ERROR')
+                    failed = True
 
-        return True
+        return not failed
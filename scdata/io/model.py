@@ -1,10 +1,10 @@
 from scdata.utils import std_out
-from joblib import dump, load
 from scdata._config import config
 from os.path import join, exists
 from os import makedirs
 
 def model_export(name = None, path = None, model = None, variables = None, hyperparameters = None, options = None, metrics = None):
+    from joblib import dump
     
     if name is None:
         std_out('No name specified', 'ERROR')
@@ -49,6 +49,7 @@ def model_export(name = None, path = None, model = None, variables = None, hyper
     return True
 
 def model_load(name = '', path = None):
+    from joblib import load
 
     if path is None: 
         path = config.paths['models']
@@ -0,0 +1,142 @@
+from os import makedirs, listdir
+from os.path import exists, join, splitext
+from scdata.utils import std_out, localise_date, clean
+from scdata.io.csv import read_csv_file, export_csv_file
+from scdata.io.columnar import read_columnar_file, export_columnar_file, columnar_formats
+from pandas import Period, concat
+
+'''
+Partitioned cache layout. Each file_name (normally the device id) is a folder
+with one file per period (partition), named after it:
+    <path>/<file_name>/2021-01.csv
+    <path>/<file_name>/2021-02.csv
+Partition can be any pandas period alias, normally 'D' (daily) or 'M' (monthly).
+Partitions are computed in the timezone of the data.
+'''
+
+def export_partitioned_file(path, file_name, df, partition = 'M', file_format = 'csv', min_date = None):
+    '''
+    Exports pandas dataframe to a partitioned folder, writing only the partitions from min_date on
+    Parameters
+    ----------
+        path: String
+            Directory path
+        file_name: String
+            Folder name for the partitions
+        df: pandas.DataFrame
+            Dataframe to export. Needs a tz-aware datetime index
+        partition: String
+            'M'
+            Period alias for each partition (i.e. 'D', 'M')
+        file_format: String
+            'csv'
+            'csv', 'parquet' or 'feather'
+        min_date: datetime
+            None
+            Only partitions containing this date or later ones are (over)written.
+            Earlier partitions are left as they are. None writes all of them
+    Returns
+    ---------
+        True if exported, False otherwise
+    '''
+
+    if file_format != 'csv' and file_format not in columnar_formats:
+        std_out(f'Not supported format {file_format}', 'ERROR')
+        return False
+
+    ppath = join(path, str(file_name))
+    if not exists(ppath): makedirs(ppath)
+
+    periods = df.index.tz_localize(None).to_period(partition)
+
+    if min_date is not None:
+        min_period = Period(localise_date(min_date, df.index.tz).tz_localize(None), freq = partition)
+        mask = periods >= min_period
+        df, periods = df[mask], periods[mask]
+
+    # One line for the whole export instead of one per partition
+    export_ok = True
+    n_partitions = 0
+    for period, dfp in df.groupby(periods):
+        if file_format == 'csv':
+            export_ok &= export_csv_file(ppath, str(period), dfp, forced_overwrite = True, verbose = False)
+        else:
+            export_ok &= export_columnar_file(ppath, str(period), dfp, forced_overwrite = True,
+                                              file_format = file_format, verbose = False)
+        n_partitions += 1
+
+    if export_ok: std_out(f'{n_partitions} partitions saved to: \n{ppath}', 'SUCCESS')
+    else: std_out(f'Problem saving partitions to {ppath}', 'ERROR')
+
+    return export_ok
+
+def __localise_bound__(date, location):
+    # Period bounds are naive local times
+    return date.tz_localize(location, ambiguous = True, nonexistent = 'shift_forward')
+
+def read_partitioned_file(path, location, frequency, clean_na = None, index_name = '',
+                          partition = 'M', min_date = None, max_date = None):
+    """
+    Reads the partitions in a folder that overlap [min_date, max_date] and puts them into
+    a pandas dataframe
+    Parameters
+    ----------
+        path: String
+            Folder containing the partitions
+        location: String
+            Time zone for the data
+        frequency: String
+            Frequency to resample to, in pandas format
+        clean_na: String or None
+            None
+            Whether to perform clean_na or not. Either None, 'fill' or 'drop'
+        index_name: String
+            ''
+            Name of the index column for csv partitions
+        partition: String
+            'M'
+            Period alias for each partition (i.e. 'D', 'M')
+        min_date: String or datetime
+            None
+            Ignore partitions before this date
+        max_date: String or datetime
+            None
+            Ignore partitions after this date
+    Returns
+    -------
+        Pandas dataframe
+    """
+
+    if not exists(path): raise FileNotFoundError(path)
+
+    min_date = localise_date(min_date, location)
+    max_date = localise_date(max_date, location)
+
+    dfs = list()
+    for file in sorted(listdir(path)):
+        name, ext = splitext(file)
+        try:
+            period = Period(name, freq = partition)
+        except ValueError:
+            std_out(f'Ignoring {file}, not a partition', 'WARNING')
+            continue
+
+        # Only the partitions that overlap with the requested dates
+        if min_date is not None and __localise_bound__(period.end_time, location) < min_date: continue
+        if max_date is not None and __localise_bound__(period.start_time, location) > max_date: continue
+
+        if ext == '.csv':
+            dfp = read_csv_file(join(path, file), location, frequency, index_name = index_name)
+        else:
+            dfp = read_columnar_file(join(path, file), location, frequency)
+        if dfp is not None: dfs.append(dfp)
+
+    if not dfs: raise FileNotFoundError(f'No partitions in {path} for the requested dates')
+
+    df = concat(dfs).sort_index()
+    df = df[~df.index.duplicated(keep='first')]
+
+    # Remove na
+    df = clean(df, clean_na, how = 'all')
+
+    return df
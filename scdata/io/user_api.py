@@ -1,4 +1,4 @@
-from requests import get
+from scdata.utils.http import get
 from scdata.utils import std_out, localise_date
 from os import environ
 
@@ -4,31 +4,46 @@ from os import makedirs
 from os.path import join, exists
 from shutil import copyfile, rmtree
 from traceback import print_exc
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
 import yaml
 import json
-import folium
 from re import sub
 
-from scdata.utils import std_out, get_tests_log
+from scdata.utils import std_out, get_tests_log, LazyCallable
 from scdata.io import read_csv_file
 from scdata._config import config
 from scdata.device import Device
-from scdata.test.plot.plot_tools import to_png_b64
+
+def _process_device(device, only_new):
+    # Runs in a worker process, the processed device is sent back
+    process_ok = device.process(only_new = only_new)
+    return device, process_ok
 
 class Test(object):
 
-    from .plot import (ts_plot, ts_iplot, device_metric_map, path_plot,
-                        scatter_plot, scatter_iplot, ts_scatter,
-                        heatmap_plot, heatmap_iplot,
-                        box_plot, ts_dendrogram,
-                        ts_dispersion_plot, ts_dispersion_grid,
-                        scatter_dispersion_grid)
-                        #, report_plot, cat_plot, violin_plot)
+    # Plots and exports need matplotlib, plotly, folium, flask... They are only imported when first used
+    ts_plot = LazyCallable('scdata.test.plot.ts_plot.ts_plot')
+    ts_iplot = LazyCallable('scdata.test.plot.ts_iplot.ts_iplot')
+    device_metric_map = LazyCallable('scdata.test.plot.maps.device_metric_map')
+    path_plot = LazyCallable('scdata.test.plot.maps.path_plot')
+    scatter_plot = LazyCallable('scdata.test.plot.scatter_plot.scatter_plot')
+    scatter_iplot = LazyCallable('scdata.test.plot.scatter_iplot.scatter_iplot')
+    ts_scatter = LazyCallable('scdata.test.plot.ts_scatter.ts_scatter')
+    heatmap_plot = LazyCallable('scdata.test.plot.heatmap_plot.heatmap_plot')
+    heatmap_iplot = LazyCallable('scdata.test.plot.heatmap_iplot.heatmap_iplot')
+    box_plot = LazyCallable('scdata.test.plot.box_plot.box_plot')
+    ts_dendrogram = LazyCallable('scdata.test.plot.ts_dendrogram.ts_dendrogram')
+    ts_dispersion_plot = LazyCallable('scdata.test.plot.ts_dispersion_plot.ts_dispersion_plot')
+    ts_dispersion_grid = LazyCallable('scdata.test.plot.ts_dispersion_grid.ts_dispersion_grid')
+    scatter_dispersion_grid = LazyCallable('scdata.test.plot.scatter_dispersion_grid.scatter_dispersion_grid')
+    #, report_plot, cat_plot, violin_plot)
 
     if config._ipython_avail:
-        from .plot import ts_uplot, ts_dispersion_uplot
-    from .export import to_csv, to_html
+        ts_uplot = LazyCallable('scdata.test.plot.ts_uplot.ts_uplot')
+        ts_dispersion_uplot = LazyCallable('scdata.test.plot.ts_dispersion_uplot.ts_dispersion_uplot')
+    to_csv = LazyCallable('scdata.test.export.to_file.to_csv')
+    to_html = LazyCallable('scdata.test.export.to_file.to_html')
     from .load import load
     from .utils import (combine, prepare, dispersion_analysis,
                         dispersion_summary, get_common_channels)
@@ -39,7 +54,9 @@ class Test(object):
                         'cached_data_margin': config.data['cached_data_margin'],
                         'load_cached_api': config.data['load_cached_api'],
                         'store_cached_api': config.data['store_cached_api'],
-                        'clean_na': config.data['clean_na']
+                        'clean_na': config.data['clean_na'],
+                        'request_window': config.data['request_window'],
+                        'workers': config.data['workers']
                         }
 
         if self.__check_tname__(name): self.__set_tname__(name)
@@ -82,6 +99,8 @@ class Test(object):
             'load_cached_api',
             'store_cached_api',
             'clean_na',
+            'request_window',
+            'workers',
             'frequency',
             'min_date',
             'max_date'
@@ -227,6 +246,7 @@ class Test(object):
             if title is not None:
                 self.content[title_cor]['title'] = title
             if figure is not None:
+                from scdata.test.plot.plot_tools import to_png_b64
                 self.content[title_cor]['image'] = to_png_b64(figure)
             if text is not None:
                 self.content[title_cor]['text'] = text
@@ -239,13 +259,50 @@ class Test(object):
 
             return False
 
-    def process(self, only_new = False):
+    def process(self, only_new = False, workers = None):
         '''
-        Calculates all the metrics in each of the devices
+        Calculates all the metrics in each of the devices. With more than one worker,
+        devices are processed in a process pool. A device failing does not stop the rest
+        Parameters
+        ----------
+            only_new: boolean
+                False
+                To process or not the existing channels in the devices readings
+            workers: int
+                None
+                Number of devices processed at the same time. None uses self.options['workers']
         Returns True if done OK
         '''
+        if workers is None: workers = self.options['workers']
+
         process_ok = True
-        for device in self.devices: process_ok &= self.devices[device].process(only_new = only_new)
+        failed = list()
+
+        if workers is None or workers <= 1:
+            for device in self.devices:
+                try:
+                    device_ok = self.devices[device].process(only_new = only_new)
+                except:
+                    print_exc()
+                    device_ok = False
+                if not device_ok: failed.append(device)
+                process_ok &= device_ok
+        else:
+            with ProcessPoolExecutor(max_workers = workers) as executor:
+                futures = {executor.submit(_process_device, self.devices[device], only_new): device
+                           for device in self.devices}
+
+                for future in as_completed(futures):
+                    device = futures[future]
+                    try:
+                        self.devices[device], device_ok = future.result()
+                    except:
+                        print_exc()
+                        device_ok = False
+                    if not device_ok: failed.append(device)
+                    process_ok &= device_ok
+
+        if failed: std_out(f'Devices not processed: {failed}', 'ERROR')
 
         # Cosmetic output
         if process_ok: std_out(f'Test {self.full_name} processed', 'SUCCESS')
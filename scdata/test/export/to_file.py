@@ -3,7 +3,6 @@
 from os.path import join, dirname, exists
 from os import makedirs
 from scdata.utils import std_out
-import flask
 from re import sub
 
 def to_csv(self, path = None, forced_overwrite = False):
@@ -69,6 +68,8 @@ def to_html(self, title = 'Your title here', template = 'sc_template.html', path
             flask rendered template
     '''
 
+    import flask
+
     # Find the path to the html templates directory
     template_folder = join(dirname(__file__), 'templates')
 
@@ -1,10 +1,13 @@
-from scdata.utils import std_out, localise_date
-from scdata.io import read_csv_file, export_csv_file
+from scdata.utils import std_out, localise_date, reserve_connections
+from scdata.io import read_csv_file, export_csv_file, export_partitioned_file
+from scdata._config import config
 from scdata.device import Device
 from os import makedirs
 from os.path import join, exists
 import yaml
 from datetime import timedelta
+from traceback import print_exc
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 def load(self, options = dict()):
 
@@ -27,6 +30,11 @@ def load(self, options = dict()):
                 Default: None
                 Clean NaN as pandas format. Possibilities: 'fill_na', 'drop_na' or None
 
+                request_window: String
+                Default: config.data['request_window']
+                Split API requests in windows of this length (i.e. '30D'). Completed windows
+                are kept in the cached folder so that an interrupted load resumes from them
+
                 frequency: String (timedelta format: https://stackoverflow.com/questions/35339139/where-is-the-documentation-on-pandas-freq-tags)
                 Default: 1Min
                 Frequency to load or request data
@@ -38,6 +46,10 @@ def load(self, options = dict()):
                 max_date: String or datetime
                 Default: None
                 Maximum date to load data to
+
+                workers: int
+                Default: config.data['workers']
+                Number of devices loaded at the same time
         Returns
         ----------
             None
@@ -62,11 +74,10 @@ def load(self, options = dict()):
 
     std_out (f'Using options: {self.options}')
 
-    for key in self.devices.keys():
+    def load_device(device):
 
-        device = self.devices[key]
         std_out('---------------------------')
-        std_out(f'Loading device {device.id}')
+        std_out(lambda: f'Loading device {device.id}')
 
         min_date_device = localise_date(device.min_date, device.location)
         max_date_device = localise_date(device.max_date, device.location)
@@ -101,12 +112,12 @@ def load(self, options = dict()):
 
                         # Get last reading from cached
                         last_reading_cached = localise_date(device.readings.index[-1], device.location)
-                        std_out(f'Last cached date {last_reading_cached}')
-                        std_out(f'Last reading in API {last_reading_api}')
+                        std_out(lambda: f'Last cached date {last_reading_cached}')
+                        std_out(lambda: f'Last reading in API {last_reading_api}')
 
                         # Check which dates to load
                         if max_date_device is not None:
-                            std_out(f'Max date in test {max_date_device}')
+                            std_out(lambda: f'Max date in test {max_date_device}')
                             # Check what where we need to load data from, if any
                             if last_reading_cached < max_date_device and last_reading_api > last_reading_cached + timedelta(hours=1):
                                 load_API = True
@@ -151,7 +162,7 @@ def load(self, options = dict()):
                         std_out('First reading requested: {}'.format(min_date_to_load))
                         if min_date_to_load > last_reading_api:
                             std_out('Discarding device. Min date requested is after last reading', 'WARNING')
-                            continue
+                            return
                     else:
                         std_out('Requesting all available data', 'WARNING')
 
@@ -174,7 +185,9 @@ def load(self, options = dict()):
                 device_options = {
                                     'clean_na': self.options['clean_na'],
                                     'min_date': min_date_to_load,
-                                    'max_date': max_date_to_load
+                                    'max_date': max_date_to_load,
+                                    'request_window': self.options['request_window'],
+                                    'window_path': join(self.path, 'cached')
                                  }
 
                 if 'frequency' in self.options:
@@ -188,18 +201,50 @@ def load(self, options = dict()):
 
         if self.options['store_cached_api'] and device.loaded and device.source == 'api' and load_API:
 
-            std_out(f'Caching files for {device.id}')
+            std_out(lambda: f'Caching files for {device.id}')
 
             cached_file_path = join(self.path, 'cached')
             if not exists(cached_file_path):
                 std_out('Creating path for exporting cached data')
                 makedirs(cached_file_path)
 
-            if export_csv_file(cached_file_path, device.id, device.readings, forced_overwrite = True): std_out('Devices cached')
+            if config.data['cache_partition'] is not None:
+                # Only rewrite the partitions with new data
+                cached_ok = export_partitioned_file(cached_file_path, device.id, device.readings,
+                                                    partition = config.data['cache_partition'],
+                                                    file_format = config.data['cache_format'],
+                                                    min_date = min_date_to_load)
+            else:
+                cached_ok = device.export(cached_file_path, forced_overwrite = True,
+                                          file_format = config.data['cache_format'])
+            if cached_ok: std_out('Devices cached')
 
         if device.loaded: std_out(f'Device {device.id} has been loaded', 'SUCCESS')
         else: std_out(f'Could not load device {device.id}. Skipping', 'WARNING')
 
+    if self.options['workers'] is None or self.options['workers'] <= 1:
+        for key in self.devices.keys():
+            try:
+                load_device(self.devices[key])
+            except:
+                print_exc()
+                std_out(f'Error loading device {key}', 'ERROR')
+    else:
+        # Devices are mostly waiting for the API, so threads are enough. Each of them
+        # requests its sensors concurrently, to the same host
+        reserve_connections(self.options['workers'] * config._max_concurrent_requests)
+        with ThreadPoolExecutor(max_workers = self.options['workers']) as executor:
+            futures = {executor.submit(load_device, self.devices[key]): key for key in self.devices.keys()}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except:
+                    print_exc()
+                    std_out(f'Error loading device {futures[future]}', 'ERROR')
+
+    failed = [key for key in self.devices.keys() if not self.devices[key].loaded]
+    if failed: std_out(f'Devices not loaded: {failed}', 'WARNING')
+
     self.__update_descriptor__()
     std_out('Test load done', 'SUCCESS')
     self.loaded = True
@@ -1,4 +1,4 @@
-from pandas import DataFrame
+from pandas import DataFrame, concat
 from scdata.utils import std_out
 from scdata.device import Device
 
@@ -19,8 +19,6 @@ def combine(self, devices = None, readings = None):
         Dataframe if successful or False otherwise
     """ 
 
-    dfc = DataFrame()
-
     if devices is None:
         dl = list(self.devices.keys())
     else: 
@@ -30,6 +28,8 @@ def combine(self, devices = None, readings = None):
             std_out('Requested devices are not all present in devices', 'WARNING')
             std_out(f'Discarding {set(devices).difference(list(self.devices.keys()))}')
 
+    dfs = list()
+
     for device in dl:
         new_names = list()
 
@@ -50,8 +50,12 @@ def combine(self, devices = None, readings = None):
         
         df = self.devices[device].readings[rl].copy()
         df.rename(columns = rename, inplace = True)
-        dfc = dfc.combine_first(df)
-    
+        dfs.append(df)
+
+    # Merge all devices at once instead of realigning on every device
+    if dfs: dfc = concat(dfs, axis = 1).sort_index().sort_index(axis = 1)
+    else: dfc = DataFrame()
+
     if dfc.empty:
         std_out('Error ocurred while combining data. Review data', 'ERROR')
         return False
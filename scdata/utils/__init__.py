@@ -1,5 +1,5 @@
 from .out import std_out
-from .date import localise_date, find_dates
+from .date import localise_date, find_dates, split_dates
 from .units import get_units_convf
 from .dictmerge import dict_fmerge
 from .lazy import LazyCallable
@@ -8,7 +8,8 @@ from .meta import get_current_blueprints, load_blueprints, get_json_from_url
 from .report import include_footer
 from .stats import spearman, get_metrics
 from .cleaning import clean
-from .location import get_elevation
+from .location import get_elevation, haversine, within_circle, GeoIndex
 from .url_check import url_checker
+from .http import retry_get, retry_post, get_session, reserve_connections
 # from .other.manage_post_info import create_post_info
 # from .zenodo import zenodo_upload
\ No newline at end of file
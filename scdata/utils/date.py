@@ -1,4 +1,4 @@
-from pandas import to_datetime
+from pandas import to_datetime, to_timedelta, date_range
 
 def localise_date(date, location):
     """
@@ -43,4 +43,27 @@ def find_dates(dataframe):
     min_date_df = dataframe.index.min().floor('D')
     max_date_df = dataframe.index.max().ceil('D')
     
-    return min_date_df, max_date_df, range_days
\ No newline at end of file
+    return min_date_df, max_date_df, range_days
+
+def split_dates(min_date, max_date, window):
+    """
+    Splits the interval between two dates into consecutive windows
+    Parameters
+    ----------
+        min_date: datetime
+            Start of the interval
+        max_date: datetime
+            End of the interval
+        window: string
+            Window length in timedelta format (i.e. '30D', '12H')
+    Returns
+    -------
+        List of (start, end) tuples covering [min_date, max_date]. The last window
+        ends at max_date and can be shorter than the rest
+    """
+
+    bounds = list(date_range(start = min_date, end = max_date, freq = to_timedelta(window)))
+    if bounds[-1] < max_date: bounds.append(max_date)
+    if len(bounds) == 1: return [(min_date, max_date)]
+
+    return list(zip(bounds[:-1], bounds[1:]))
@@ -0,0 +1,232 @@
+from requests import Session
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib.parse import urlparse
+from threading import Lock
+import os
+from time import sleep, monotonic, time
+from email.utils import parsedate_to_datetime
+from scdata.utils.ratelimit import acquire, block
+
+# One session (keep-alive connection pool) per API host, shared by all connectors
+_sessions = dict()
+_sessions_lock = Lock()
+
+def _reset_sessions():
+    # Forked processes (i.e. Test.process workers) must not share the parent's open connections
+    global _sessions, _sessions_lock
+    _sessions = dict()
+    _sessions_lock = Lock()
+
+if hasattr(os, 'register_at_fork'): os.register_at_fork(after_in_child = _reset_sessions)
+
+# Backoff shared by all the requests in flight to hosts that are not rate limited
+# (see scdata.utils.ratelimit). When one of them gets a 429, the rest wait as well
+_backoff_lock = Lock()
+_backoff_until = 0
+
+def _get_config():
+    # Requests made while the config is created, before scdata._config.config exists,
+    # use the defaults in the class
+    from scdata._config.config import Config
+    from scdata._config import config
+    if not isinstance(config, Config): return Config
+    return config
+
+# Connections needed at once per host, if more than config._http_pool_size (see reserve_connections)
+_pool_size = 0
+
+def _mount_adapter(session, config):
+    # Transport level retries: connection errors and server errors.
+    # 429 is handled by retry_get, and POST/PATCH are not retried
+    retries = Retry(total = config._http_retries,
+                    connect = config._http_connect_retries,
+                    backoff_factor = config._http_retry_backoff,
+                    status_forcelist = [500, 502, 503, 504],
+                    raise_on_status = False)
+    adapter = HTTPAdapter(pool_connections = 1,
+                          pool_maxsize = max(config._http_pool_size, _pool_size),
+                          max_retries = retries)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+def get_session(url):
+    '''
+        Gets the pooled session for the host of the url, creating it if needed
+        Parameters
+        ----------
+            url: String
+                Url to request
+        Returns
+        -------
+            requests.Session
+    '''
+    host = urlparse(url).netloc
+
+    with _sessions_lock:
+        if host not in _sessions:
+            session = Session()
+            _mount_adapter(session, _get_config())
+            _sessions[host] = session
+
+        return _sessions[host]
+
+def reserve_connections(connections):
+    '''
+        Makes the sessions keep alive at least some connections per host, i.e. when several
+        devices request their sensors concurrently. Otherwise the connections over
+        config._http_pool_size are opened and closed on each request
+        Parameters
+        ----------
+            connections: int
+                Requests in flight at once to the same host
+        Returns
+        -------
+            None
+    '''
+    global _pool_size
+
+    with _sessions_lock:
+        if connections <= max(_pool_size, _get_config()._http_pool_size): return
+        _pool_size = connections
+        # The sessions created already get a bigger pool as well
+        for session in _sessions.values(): _mount_adapter(session, _get_config())
+
+def request(method, url, **kwargs):
+    '''
+        Performs a request in the pooled session of the url host, once the
+        rate limiter allows it, with config._http_timeout unless other timeout is given
+        Parameters
+        ----------
+            method: String
+                HTTP method
+            url: String
+                Url to request
+            kwargs:
+                Passed to requests.Session.request
+        Returns
+        -------
+            requests.Response
+    '''
+    if 'timeout' not in kwargs: kwargs['timeout'] = _get_config()._http_timeout
+    acquire(url)
+    return get_session(url).request(method, url, **kwargs)
+
+def get(url, params = None, **kwargs):
+    return request('GET', url, params = params, **kwargs)
+
+def post(url, data = None, json = None, **kwargs):
+    return request('POST', url, data = data, json = json, **kwargs)
+
+def patch(url, data = None, **kwargs):
+    return request('PATCH', url, data = data, **kwargs)
+
+def _wait_backoff():
+    with _backoff_lock: wait = _backoff_until - monotonic()
+    if wait > 0: sleep(wait)
+
+def _set_backoff(seconds):
+    global _backoff_until
+    with _backoff_lock: _backoff_until = max(_backoff_until, monotonic() + seconds)
+
+def retry_after(response):
+    '''
+        Gets the seconds to wait from the Retry-After header of a response (seconds or HTTP date)
+        Parameters
+        ----------
+            response: requests.Response
+                Response to check
+        Returns
+        -------
+            Seconds or None if not present or not valid
+    '''
+    value = response.headers.get('Retry-After')
+    if value is None: return None
+    try:
+        return max(0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0, parsedate_to_datetime(value).timestamp() - time())
+    except (TypeError, ValueError):
+        return None
+
+def retry_request(method, url, retry_on = [429], **kwargs):
+    '''
+        Performs a request, retrying with exponential backoff on the given status codes,
+        or waiting as requested by the API in the Retry-After header
+        Parameters
+        ----------
+            method: String
+                HTTP method
+            url: String
+                Url to request
+            retry_on: list
+                [429]
+                Status codes to retry on
+            kwargs:
+                Passed to request
+        Returns
+        -------
+            requests.Response of the last attempt
+    '''
+    from scdata.utils.out import std_out
+    config = _get_config()
+
+    for attempt in range(config._max_retries + 1):
+        _wait_backoff()
+        response = request(method, url, **kwargs)
+
+        if response.status_code not in retry_on: break
+        if attempt == config._max_retries: break
+
+        backoff = retry_after(response)
+        if backoff is None: backoff = config._retry_backoff * 2 ** attempt
+        std_out(f'API responded {response.status_code}, waiting {backoff:.0f}s for retry ({attempt+1}/{config._max_retries})', 'WARNING')
+        # Only too many requests makes the rest of the requests wait, in all processes if possible
+        if response.status_code == 429:
+            if not block(url, backoff): _set_backoff(backoff)
+        else: sleep(backoff)
+
+    return response
+
+def retry_get(url, headers = None, **kwargs):
+    '''
+        Performs a GET request, retrying with exponential backoff in case of 429
+        Parameters
+        ----------
+            url: String
+                Url to request
+            headers: dict
+                None
+                Headers for the request
+            kwargs:
+                Passed to get
+        Returns
+        -------
+            requests.Response of the last attempt
+    '''
+    return retry_request('GET', url, headers = headers, **kwargs)
+
+def retry_post(url, data = None, headers = None, **kwargs):
+    '''
+        Performs a POST request, retrying with exponential backoff in case of 429 or
+        server errors (5xx), as they are not retried by the session
+        Parameters
+        ----------
+            url: String
+                Url to request
+            data:
+                None
+                Body of the request
+            headers: dict
+                None
+                Headers for the request
+            kwargs:
+                Passed to post
+        Returns
+        -------
+            requests.Response of the last attempt
+    '''
+    return retry_request('POST', url, retry_on = [429, 500, 502, 503, 504],
+                         data = data, headers = headers, **kwargs)
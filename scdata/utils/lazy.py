@@ -1,10 +1,12 @@
 import sys
+from types import MethodType
 from .out import std_out
 
 class LazyCallable(object):
     '''
         Adapted from Alex Martelli's answer on this post on stackoverflow:
         https://stackoverflow.com/questions/3349157/python-passing-a-function-name-as-an-argument-in-a-function
+        Can also be a class attribute, for methods whose module is only imported when first called
     '''
     def __init__(self, name):
         self.n = name
@@ -17,3 +19,7 @@ class LazyCallable(object):
                 __import__(modn)
             self.f = getattr(sys.modules[modn], funcn)
         return self.f(*a, **k)
+    def __get__(self, obj, objtype = None):
+        # Bound to the instance when used as a method in a class
+        if obj is None: return self
+        return MethodType(self, obj)
@@ -1,5 +1,9 @@
-from requests import get
+from scdata.utils.http import get
 from pandas import json_normalize
+from numpy import radians, sin, cos, arcsin, sqrt, asarray, isfinite, column_stack
+
+# Mean earth radius in m
+EARTH_RADIUS = 6371008.8
 
 def get_elevation(_lat = None, _long = None):
     '''
@@ -21,4 +25,87 @@ def get_elevation(_lat = None, _long = None):
         elevation = json_normalize(r.json(), 'results')['elevation'].values[0]
     else:
         elevation = None
-    return elevation
\ No newline at end of file
+    return elevation
+
+def haversine(lat, long, lat0, long0):
+    '''
+        Great-circle distance in m between arrays of points (lat, long)
+        and a point (lat0, long0), in degrees. NaN for NaN coordinates
+    '''
+    lat, long = radians(asarray(lat, dtype = float)), radians(asarray(long, dtype = float))
+    lat0, long0 = radians(lat0), radians(long0)
+
+    a = sin((lat - lat0) / 2) ** 2 + cos(lat) * cos(lat0) * sin((long - long0) / 2) ** 2
+    return 2 * EARTH_RADIUS * arcsin(sqrt(a))
+
+def within_circle(lat, long, within):
+    '''
+        Whether or not arrays of points (lat, long) are within a circle
+        Parameters
+        ----------
+            lat: array-like
+                Latitudes in degrees
+            long: array-like
+                Longitudes in degrees
+            within: tuple
+                within = tuple(lat, long, radius_meters)
+        Returns
+        -------
+            numpy array of bool. False for NaN coordinates
+    '''
+    return haversine(lat, long, within[0], within[1]) < within[2]
+
+class GeoIndex(object):
+    '''
+        Spatial index (BallTree on haversine distance) over the rows of a dataframe
+        with latitude and longitude columns, for repeated radius, bbox and
+        k-nearest queries. Rows without valid coordinates are not indexed
+        Parameters
+        ----------
+            df: pandas.DataFrame
+                Dataframe to index
+            lat_name: str
+                'latitude'
+                Column name for latitude in dataframe
+            long_name: str
+                'longitude'
+                Column name for longitude in dataframe
+    '''
+
+    def __init__(self, df, lat_name = 'latitude', long_name = 'longitude'):
+        from sklearn.neighbors import BallTree
+
+        lat = asarray(df[lat_name], dtype = float)
+        long = asarray(df[long_name], dtype = float)
+        valid = isfinite(lat) & isfinite(long)
+
+        self.lat_name = lat_name
+        self.long_name = long_name
+        self.df = df[valid]
+        # BallTree does not accept empty data, queries return empty dataframes then
+        if self.df.empty: self.tree = None
+        else: self.tree = BallTree(radians(column_stack([lat[valid], long[valid]])), metric = 'haversine')
+
+    def within(self, lat, long, radius):
+        '''
+            Rows within radius (in m) of (lat, long), with their 'distance' in m, closest first
+        '''
+        if self.tree is None: return self.df.assign(distance = [])
+        idx, dist = self.tree.query_radius(radians([[lat, long]]), r = radius / EARTH_RADIUS,
+                                           return_distance = True, sort_results = True)
+        return self.df.iloc[idx[0]].assign(distance = dist[0] * EARTH_RADIUS)
+
+    def nearest(self, lat, long, k = 1):
+        '''
+            k nearest rows to (lat, long), with their 'distance' in m, closest first
+        '''
+        if self.tree is None: return self.df.assign(distance = [])
+        dist, idx = self.tree.query(radians([[lat, long]]), k = min(k, len(self.df)))
+        return self.df.iloc[idx[0]].assign(distance = dist[0] * EARTH_RADIUS)
+
+    def bbox(self, min_lat, min_long, max_lat, max_long):
+        '''
+            Rows within the bounding box
+        '''
+        lat, long = self.df[self.lat_name], self.df[self.long_name]
+        return self.df[(lat >= min_lat) & (lat <= max_lat) & (long >= min_long) & (long <= max_long)]
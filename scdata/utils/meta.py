@@ -4,8 +4,11 @@ from os.path import join, dirname, expanduser, exists, basename
 from urllib.parse import urlparse
 import os
 from shutil import copyfile
-from requests import get
+from scdata.utils.http import get, _get_config
 from traceback import print_exc
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha1
+from threading import get_ident
 import json
 from re import sub
 
@@ -120,11 +123,10 @@ def load_env(env_file):
 
 def load_blueprints(urls):
 
+    urls = [url for url in urls if url is not None]
     blueprints = dict()
-    for url in urls:
-        if url is None: continue
+    for url, _blueprint in zip(urls, get_jsons_from_urls(urls)):
         _nblueprint = basename(urlparse(str(url)).path).split('.')[0]
-        _blueprint = get_json_from_url(url)
 
         if _nblueprint not in blueprints:
             blueprints[_nblueprint] = _blueprint
@@ -133,27 +135,101 @@ def load_blueprints(urls):
 
 def get_current_blueprints():
     from scdata._config import config
-    if not config.is_init: config.get_meta_data()
 
     return list(config.blueprints.keys())
 
+def _validator_path(url):
+    # Validators (ETag, Last-Modified) and content of the urls, in paths['interim']/http
+    config = _get_config()
+    if not hasattr(config, 'paths'): return None
+    return join(config.paths['interim'], 'http', f'{sha1(url.encode()).hexdigest()}.json')
+
+def get_text_from_url(url):
+    '''
+        Gets the text of an url, with a conditional request if it was downloaded before.
+        The ETag and Last-Modified of the response are kept with the text, and if the
+        server responds 304 (not modified), the kept text is returned
+        Parameters
+        ----------
+            url: String
+                Url to request
+        Returns
+        ---------
+            Text or None if the request failed
+    '''
+    path = _validator_path(url)
+    cached = None
+    headers = dict()
+
+    if path is not None and exists(path):
+        try:
+            with open(path, 'r') as file: cached = json.load(file)
+        except ValueError:
+            cached = None
+
+    if cached is not None:
+        if cached['etag'] is not None: headers['If-None-Match'] = cached['etag']
+        if cached['last_modified'] is not None: headers['If-Modified-Since'] = cached['last_modified']
+
+    try:
+        rget = get(url, headers = headers)
+    except:
+        print ('Failed request. Probably no connection')
+        return None
+
+    if rget.status_code == 304 and cached is not None: return cached['text']
+
+    if rget.status_code != 200 and rget.status_code != 201:
+        print (f'Failed request. Response {rget.status_code}')
+        return None
+
+    if path is not None and ('ETag' in rget.headers or 'Last-Modified' in rget.headers):
+        try:
+            makedirs(dirname(path), exist_ok = True)
+            # Write and rename, so that other processes never read half a file
+            tmp = f'{path}.{os.getpid()}.{get_ident()}'
+            with open(tmp, 'w') as file:
+                json.dump({'url': url,
+                           'etag': rget.headers.get('ETag'),
+                           'last_modified': rget.headers.get('Last-Modified'),
+                           'text': rget.text}, file)
+            os.replace(tmp, path)
+        except:
+            print (f'Could not keep validators for {url}')
+
+    return rget.text
+
 def get_json_from_url(url):
 
     rjson = None
     # Gets a json from an url and returns it as a dict
-    try:
-        rget = get(url)
+    text = get_text_from_url(url)
+    if text is None: return None
 
-        if rget.status_code == 200 or rget.status_code == 201:
-            rjson = rget.json()
-        else:
-            print (f'Failed request. Response {rget.status_code}')
-    except:
-        print ('Failed request. Probably no connection or invalid json file')
+    try:
+        rjson = json.loads(text)
+    except ValueError:
+        print ('Failed request. Invalid json file')
         pass
 
     return rjson
 
+def get_jsons_from_urls(urls):
+    '''
+        Gets the jsons of several urls concurrently (config._max_concurrent_requests)
+        Parameters
+        ----------
+            urls: list
+                Urls to request
+        Returns
+        ---------
+            List of dicts (None for the failed ones) in the same order as urls
+    '''
+    if len(urls) < 2: return [get_json_from_url(url) for url in urls]
+
+    with ThreadPoolExecutor(max_workers = min(len(urls), _get_config()._max_concurrent_requests)) as executor:
+        return list(executor.map(get_json_from_url, urls))
+
 def load_firmware_names(sensorsh):
     '''
         Loads sensor names from Sensors.h of firmware repo
@@ -168,7 +244,7 @@ def load_firmware_names(sensorsh):
     try:
         sensor_names = dict()
         # Read only 20000 chars
-        data = get(sensorsh).text
+        data = get_text_from_url(sensorsh)
         # split it into lines
         data = data.split('\n')
         line_sensors = len(data)
@@ -236,9 +312,9 @@ def load_calibrations(urls):
     '''
 
     calibrations = dict()
-    for url in urls:
+    for url, _calibrations in zip(urls, get_jsons_from_urls(urls)):
         try:
-            calibrations = dict_fmerge(get_json_from_url(url), calibrations)
+            calibrations = dict_fmerge(_calibrations, calibrations)
         except:
             print(f'Problem loading calibrations from {url}')
             return None
@@ -248,9 +324,8 @@ def load_calibrations(urls):
 def load_connectors(urls):
 
     connectors = dict()
-    for url in urls:
+    for url, c in zip(urls, get_jsons_from_urls(urls)):
         try:
-            c = get_json_from_url(url)
             _nc = basename(urlparse(str(url)).path).split('.')[0]
             connectors[_nc] = c
         except:
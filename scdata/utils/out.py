@@ -1,27 +1,134 @@
 from termcolor import colored
 from scdata._config import config
 from datetime import datetime
+from os.path import basename
+from socket import gethostname
+import logging
+from threading import Lock
+import json
+import sys
+
+# Message types and their logging levels. Other types are never shown
+SUCCESS = 25
+logging.addLevelName(SUCCESS, 'SUCCESS')
+_levels = {None: logging.INFO, 'SUCCESS': SUCCESS, 'WARNING': logging.WARNING, 'ERROR': logging.ERROR}
+
+# Output levels:
+# 'QUIET': nothing,
+# 'NORMAL': warn, err, success
+# 'DEBUG': info, warn, err, success
+_out_levels = {'QUIET': logging.CRITICAL + 1, 'NORMAL': SUCCESS, 'DEBUG': logging.INFO}
+
+_colors = {'SUCCESS': 'green', 'WARNING': 'yellow', 'ERROR': 'red'}
+
+class _LevelFilter(logging.Filter):
+    # Checks the level in the config on each message, as it can be changed at any time
+    def __init__(self, level_attr):
+        super().__init__()
+        self.level_attr = level_attr
+
+    def filter(self, record):
+        if getattr(record, 'force', False): return True
+        return record.levelno >= _out_levels.get(getattr(config, self.level_attr), SUCCESS)
+
+class _ConsoleHandler(logging.Handler):
+    # Prints, so that the output goes wherever sys.stdout is at the moment (i.e. notebooks)
+    def emit(self, record):
+        try:
+            print(self.format(record))
+        except:
+            self.handleError(record)
+
+class _ConsoleFormatter(logging.Formatter):
+    def format(self, record):
+        if config._timestamp == True:
+            stamp = datetime.fromtimestamp(record.created).strftime('%Y-%m-%d %H:%M:%S')
+        else:
+            stamp = ''
+        tag = f'[{record.levelname}] '
+        if record.levelname in _colors: tag = colored(tag, _colors[record.levelname])
+        return f'[{stamp}] - ' + tag + record.getMessage()
+
+class _JSONFormatter(logging.Formatter):
+    def format(self, record):
+        return json.dumps({
+            'time': datetime.fromtimestamp(record.created).astimezone().isoformat(),
+            'level': record.levelname,
+            'message': record.getMessage(),
+            'module': record.caller,
+            'host': _host,
+            'pid': record.process,
+            'script': _script
+        })
+
+_host = gethostname()
+_script = basename(sys.argv[0]) if sys.argv and sys.argv[0] else None
+
+logger = logging.getLogger('scdata')
+logger.setLevel(logging.DEBUG)
+logger.propagate = False
+_console = _ConsoleHandler()
+_console.setFormatter(_ConsoleFormatter())
+_console.addFilter(_LevelFilter('_out_level'))
+logger.addHandler(_console)
+
+_json_handler = None
+_json_path = None
+# std_out is called from several threads (i.e. concurrent requests and metrics)
+_json_lock = Lock()
+
+def _update_json_handler():
+    # Opens (or closes) the JSON log if config._log_json changed
+    global _json_handler, _json_path
+    if config._log_json == _json_path: return
+
+    with _json_lock:
+        path = config._log_json
+        if path == _json_path: return
+
+        if _json_handler is not None:
+            logger.removeHandler(_json_handler)
+            _json_handler.close()
+            _json_handler = None
+
+        if path is not None:
+            # Append mode: each message is a single write, so concurrent processes do not mix lines
+            handler = logging.FileHandler(path, mode = 'a', encoding = 'utf-8', delay = True)
+            handler.setFormatter(_JSONFormatter())
+            handler.addFilter(_LevelFilter('_log_json_level'))
+            logger.addHandler(handler)
+            _json_handler = handler
+        _json_path = path
 
 def std_out(msg, mtype = None, force = False):
-    out_level = config._out_level
-    if config._timestamp == True:
-        stamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    else:
-        stamp = ''
-    # Output levels:
-    # 'QUIET': nothing, 
-    # 'NORMAL': warn, err
-    # 'DEBUG': info, warn, err, success
-    if force == True: priority = 2
-    elif out_level == 'QUIET': priority = 0
-    elif out_level == 'NORMAL': priority = 1
-    elif out_level == 'DEBUG': priority = 2
-
-    if mtype is None and priority>1: 
-        print(f'[{stamp}] - ' + '[INFO] ' + msg)
-    elif mtype == 'SUCCESS' and priority>0: 
-        print(f'[{stamp}] - ' + colored('[SUCCESS] ', 'green') + msg)
-    elif mtype == 'WARNING' and priority>0: 
-        print(f'[{stamp}] - ' + colored('[WARNING] ', 'yellow') + msg)
-    elif mtype == 'ERROR' and priority>0: 
-        print(f'[{stamp}] - ' + colored('[ERROR] ', 'red') + msg)
\ No newline at end of file
+    '''
+        Outputs a message if the output level in the config allows it, to the console
+        and to the JSON log (config._log_json) if set. Suppressed messages return right away
+        Parameters
+        ----------
+            msg: String or callable
+                Message, or function returning it, which is only called if the message is output
+            mtype: String
+                None
+                None (info), 'SUCCESS', 'WARNING' or 'ERROR'
+            force: bool
+                False
+                Output regardless of the output level
+        Returns
+        -------
+            None
+    '''
+    if mtype is not None and not isinstance(mtype, str): return
+    level = _levels.get(mtype)
+    if level is None: return
+
+    threshold = _out_levels.get(config._out_level, SUCCESS)
+    if config._log_json is not None or _json_handler is not None:
+        _update_json_handler()
+        if _json_handler is not None:
+            threshold = min(threshold, _out_levels.get(config._log_json_level, SUCCESS))
+    if level < threshold and not force: return
+
+    if callable(msg): msg = msg()
+    caller = sys._getframe(1).f_globals.get('__name__')
+    logger.log(level, msg, extra = {'force': force, 'caller': caller})
@@ -0,0 +1,131 @@
+import sqlite3
+import threading
+from os import getpid
+from os.path import join
+from urllib.parse import urlparse
+from time import sleep, time
+
+'''
+Token bucket rate limiter per API host, shared by all the processes using scdata
+(i.e. several scheduled jobs starting at the same time). The state of the buckets
+is kept in a SQLite database under config.paths['tasks'], and each acquire is a
+short write transaction, so processes queue on the database lock instead of on the API.
+'''
+
+_DB_NAME = 'ratelimit.db'
+
+# One connection per thread, opened again in forked processes
+_local = threading.local()
+# Databases whose schema exists already, per process
+_schemas = set()
+_schemas_lock = threading.Lock()
+
+def _connect(url):
+    from scdata.utils.http import _get_config
+    config = _get_config()
+
+    # Requests made before the config (and its paths) is available, and to
+    # hosts not in config._rate_limit, are not limited
+    host = urlparse(url).netloc
+    if not hasattr(config, 'paths') or not config._rate_limit or host not in config._rate_limit:
+        return None, host, config
+
+    path = join(config.paths['tasks'], _DB_NAME)
+    if getattr(_local, 'pid', None) == getpid() and _local.path == path: return _local.connection, host, config
+
+    connection = sqlite3.connect(path, timeout = 60, isolation_level = None)
+    # The buckets are disposable, no need to wait for the disk
+    connection.execute('PRAGMA synchronous = OFF')
+
+    with _schemas_lock:
+        if (getpid(), path) not in _schemas:
+            connection.execute('''CREATE TABLE IF NOT EXISTS buckets (
+                                    host TEXT PRIMARY KEY,
+                                    tokens REAL,
+                                    updated REAL,
+                                    blocked_until REAL)''')
+            _schemas.add((getpid(), path))
+
+    _local.pid, _local.path, _local.connection = getpid(), path, connection
+    return connection, host, config
+
+def _get_bucket(connection, host, now, burst):
+    row = connection.execute('SELECT tokens, updated, blocked_until FROM buckets WHERE host = ?',
+                             (host, )).fetchone()
+    if row is None: return burst, now, 0
+    return row
+
+def _set_bucket(connection, host, tokens, updated, blocked_until):
+    connection.execute('INSERT OR REPLACE INTO buckets VALUES (?, ?, ?, ?)',
+                       (host, tokens, updated, blocked_until))
+
+def acquire(url):
+    '''
+        Waits until a request to the host of the url is allowed, by all processes,
+        and takes a token from its bucket.
+        The bucket refills at config._rate_limit[host] requests per second, up to config._rate_limit_burst
+        Parameters
+        ----------
+            url: String
+                Url to request
+        Returns
+        -------
+            Seconds waited
+    '''
+    connection, host, config = _connect(url)
+    if connection is None: return 0
+
+    rate, burst = config._rate_limit[host], config._rate_limit_burst
+    waited = 0
+
+    while True:
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            now = time()
+            tokens, updated, blocked_until = _get_bucket(connection, host, now, burst)
+
+            # While blocked the bucket is left as is, so that it refills from the end of the block
+            if now < blocked_until: wait = blocked_until - now
+            else:
+                tokens = min(burst, tokens + max(0, now - updated) * rate)
+                if tokens >= 1: wait = 0; tokens -= 1
+                else: wait = (1 - tokens) / rate
+                _set_bucket(connection, host, tokens, now, blocked_until)
+            connection.execute('COMMIT')
+        except:
+            connection.execute('ROLLBACK')
+            raise
+
+        if not wait: return waited
+        sleep(wait)
+        waited += wait
+
+def block(url, seconds):
+    '''
+        Stops all requests to the host of the url, from all processes, during some time
+        and empties its bucket, so that requests restart slowly afterwards
+        Parameters
+        ----------
+            url: String
+                Url that was requested
+            seconds: float
+                Seconds to wait
+        Returns
+        -------
+            True if the block is shared with other processes, False if the host is not rate limited
+    '''
+    connection, host, config = _connect(url)
+    if connection is None: return False
+
+    connection.execute('BEGIN IMMEDIATE')
+    try:
+        now = time()
+        _, _, blocked_until = _get_bucket(connection, host, now, config._rate_limit_burst)
+        blocked_until = max(blocked_until, now + seconds)
+        _set_bucket(connection, host, 0, blocked_until, blocked_until)
+        connection.execute('COMMIT')
+    except:
+        connection.execute('ROLLBACK')
+        raise
+
+    return True
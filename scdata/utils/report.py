@@ -1,9 +1,8 @@
-from reportlab.pdfgen.canvas import Canvas
-from pdfrw import PdfReader
-from pdfrw.toreportlab import makerl
-from pdfrw.buildxobj import pagexobj
-
 def include_footer(input_file_path, output_file_path, link = None):
+    from reportlab.pdfgen.canvas import Canvas
+    from pdfrw import PdfReader
+    from pdfrw.toreportlab import makerl
+    from pdfrw.buildxobj import pagexobj
 
     # Get pages
     reader = PdfReader(input_file_path)
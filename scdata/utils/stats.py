@@ -1,6 +1,5 @@
 from scipy.stats import pearsonr
 from numpy import mean, std, power
-from sklearn.metrics import r2_score
 from math import sqrt
 
 def spearman(x, y):
@@ -30,6 +29,8 @@ def get_metrics(reference, estimation):
                 - root mean squared deviation (rmsd)
                 - rmsd normalised and ubiased
         '''
+    from sklearn.metrics import r2_score
+
     metricsd = dict()
     
     # Average
@@ -1,7 +1,70 @@
-from re import search
+from re import compile as re_compile
 from scdata.utils.out import std_out
 from scdata._config import config
 
+class _UnitsTable(object):
+    '''
+        Conversion rules of config._channel_lut, config._molecular_weights and
+        config._unit_convertion_lut compiled once, with the factors found for
+        each (sensor, from_units) memoised
+    '''
+    def __init__(self, channel_lut, molecular_weights, unit_convertion_lut):
+        self.channels = []
+        for channel, units in channel_lut:
+            pattern = re_compile(channel)
+            # Molecular weight in case of pollutants
+            molecular_weight = next((weight for pollutant, weight in molecular_weights
+                                     if pattern.search(pollutant)), 1)
+            self.channels.append((pattern, units, molecular_weight))
+
+        # Both directions, the first rule in the table wins
+        self.conversions = dict()
+        for from_unit, to_unit, factor, requires_conc in unit_convertion_lut:
+            self.conversions.setdefault((from_unit, to_unit), (factor, requires_conc))
+            self.conversions.setdefault((to_unit, from_unit), (1/factor, requires_conc))
+
+        self.factors = dict()
+
+    def factor(self, sensor, from_units):
+        if (sensor, from_units) not in self.factors:
+            self.factors[(sensor, from_units)] = self.__find_factor__(sensor, from_units)
+        return self.factors[(sensor, from_units)]
+
+    def __find_factor__(self, sensor, from_units):
+        rfactor = 1
+        for pattern, units, molecular_weight in self.channels:
+            if not pattern.search(sensor): continue
+
+            # Check if channel is in look-up table
+            if units != from_units:
+                std_out(lambda: f"Converting units for {sensor}. From {from_units} to {units}")
+                if (from_units, units) not in self.conversions:
+                    std_out(f"No conversion from {from_units} to {units}", 'ERROR')
+                    rfactor = 1
+                    continue
+                factor, requires_conc = self.conversions[(from_units, units)]
+                if requires_conc: rfactor = factor/molecular_weight
+                else: rfactor = factor
+                std_out(lambda: f"Factor: {rfactor}")
+            else:
+                std_out(lambda: f"No units conversion needed for {sensor}")
+                rfactor = 1
+            if rfactor != 1: break
+
+        return rfactor
+
+_units_table = None
+
+def _get_units_table():
+    global _units_table
+    # Compiled again if the tables in the config are replaced
+    tables = (config._channel_lut, config._molecular_weights, config._unit_convertion_lut)
+    if _units_table is None or any(a is not b for a, b in zip(_units_table[0], tables)):
+        _units_table = (tables, _UnitsTable(config._channel_lut.items(),
+                                            config._molecular_weights.items(),
+                                            config._unit_convertion_lut))
+    return _units_table[1]
+
 def get_units_convf(sensor, from_units):
     """
     Returns a factor which will be multiplied to sensor. It accounts for unit
@@ -18,40 +81,8 @@ def get_units_convf(sensor, from_units):
         factor (float)
         factor = unit_convertion_factor/molecular_weight
     Note:
-        This would need to be changed if all pollutants were to be expresed in 
+        This would need to be changed if all pollutants were to be expresed in
         mass units, instead of ppm/b
     """
 
-    rfactor = 1
-
-    for channel in config._channel_lut.keys():
-        if not (search(channel, sensor)): continue
-        # Molecular weight in case of pollutants
-        for pollutant in config._molecular_weights.keys():
-            if search(channel, pollutant): 
-                molecular_weight = config._molecular_weights[pollutant]
-                break
-            else: molecular_weight = 1
-        
-        # Check if channel is in look-up table
-        if config._channel_lut[channel] != from_units: 
-            std_out(f"Converting units for {sensor}. From {from_units} to {config._channel_lut[channel]}")
-            for unit in config._unit_convertion_lut:
-                # Get units
-                if unit[0] == from_units and unit[1] == config._channel_lut[channel]: 
-                    factor = unit[2]
-                    requires_conc = unit[3]
-                    break
-                elif unit[1] == from_units and unit[0] == config._channel_lut[channel]: 
-                    factor = 1/unit[2]
-                    requires_conc = unit[3]
-                    break
-            if requires_conc: rfactor = factor/molecular_weight
-            else: rfactor = factor
-            std_out(f"Factor: {rfactor}")
-        else: 
-            std_out(f"No units conversion needed for {sensor}")
-            rfactor = 1
-        if rfactor != 1: break
-    
-    return rfactor
\ No newline at end of file
+    return _get_units_table().factor(sensor, from_units)
@@ -0,0 +1,50 @@
+'''
+Benchmark of the column merge used in ScApiDevice.get_device_data and
+Test.combine: repeated combine_first vs. one aligned concat.
+Each column is one month of 1-minute data with some missing timestamps,
+as it would come per sensor from the API.
+
+Usage:
+    python tests/benchmarks/bench_combine.py
+'''
+
+from timeit import default_timer
+from numpy.random import default_rng
+from pandas import DataFrame, date_range, concat
+from pandas.testing import assert_frame_equal
+
+N_COLUMNS = [10, 50, 200]
+PERIOD = ('2021-01-01', '2021-01-31 23:59')
+FREQUENCY = '1Min'
+
+def make_columns(n_columns, seed = 0):
+    rng = default_rng(seed)
+    index = date_range(*PERIOD, freq = FREQUENCY, tz = 'Europe/Madrid', name = 'TIME')
+    columns = list()
+    for i in range(n_columns):
+        # Drop ~5% of the timestamps on each column so that they need aligning
+        mask = rng.random(len(index)) > 0.05
+        columns.append(DataFrame({f'SENSOR_{i}': rng.random(mask.sum())}, index = index[mask]))
+    return columns
+
+def combine_first_merge(columns):
+    df = DataFrame()
+    for column in columns: df = df.combine_first(column)
+    return df
+
+def concat_merge(columns):
+    return concat(columns, axis = 1).sort_index().sort_index(axis = 1)
+
+def timed(function, *args):
+    start = default_timer()
+    result = function(*args)
+    return result, default_timer() - start
+
+if __name__ == '__main__':
+    print(f'{"columns":>8} {"combine_first (s)":>18} {"concat (s)":>11} {"speedup":>8}')
+    for n_columns in N_COLUMNS:
+        columns = make_columns(n_columns)
+        old, t_old = timed(combine_first_merge, columns)
+        new, t_new = timed(concat_merge, columns)
+        assert_frame_equal(old, new, check_freq = False)
+        print(f'{n_columns:>8} {t_old:>18.3f} {t_new:>11.3f} {t_old/t_new:>7.1f}x')
@@ -0,0 +1,56 @@
+'''
+Benchmark of get_delta_baseline: previous loop over windows vs. the
+vectorised version, on 30 days of 1-minute data with some gaps (NaN),
+for each delta in config._baseline_deltas.
+
+Usage:
+    python tests/benchmarks/bench_delta_baseline.py
+'''
+
+from timeit import default_timer
+from numpy import nan
+from numpy.random import default_rng
+from pandas import Series, date_range
+from pandas.testing import assert_series_equal
+from scdata._config import config
+from scdata.device.process import get_delta_baseline
+
+PERIOD = ('2021-01-01', '2021-01-30 23:59')
+FREQUENCY = '1Min'
+
+def make_series(seed = 0):
+    rng = default_rng(seed)
+    index = date_range(*PERIOD, freq = FREQUENCY, tz = 'Europe/Madrid', name = 'TIME')
+    values = rng.random(len(index))
+    values[rng.random(len(index)) < 0.05] = nan
+    return Series(values, index = index, name = 'SENSOR')
+
+def loop_delta_baseline(series, delta, btype = 'min'):
+    # Previous implementation
+    result = series.copy()
+    pdates = date_range(start = result.index[0], end = result.index[-1], freq = f'{delta}Min')
+
+    for pos in range(0, len(pdates)-1):
+        chunk = series[pdates[pos]:pdates[pos+1]]
+
+        if len(chunk.values) == 0: result[pdates[pos]:pdates[pos+1]] = 0
+        else:
+            if btype == 'min': result[pdates[pos]:pdates[pos+1]] = min(chunk.values)
+            elif btype == 'max': result[pdates[pos]:pdates[pos+1]] = max(chunk.values)
+
+    return result
+
+def timed(function, *args, **kwargs):
+    start = default_timer()
+    result = function(*args, **kwargs)
+    return result, default_timer() - start
+
+if __name__ == '__main__':
+    series = make_series()
+    print(f'{"delta":>6} {"loop (s)":>9} {"vectorised (s)":>15} {"speedup":>8}')
+    for delta in config._baseline_deltas:
+        for btype in ['min', 'max']:
+            old, t_old = timed(loop_delta_baseline, series, delta, btype)
+            new, t_new = timed(get_delta_baseline, series, delta = delta, btype = btype)
+            assert_series_equal(old, new)
+        print(f'{delta:>6} {t_old:>9.3f} {t_new:>15.3f} {t_old/t_new:>7.1f}x')
@@ -0,0 +1,35 @@
+'''
+Benchmark of the startup time of scdata: wall time of python -c "import scdata"
+in a new interpreter, and of the first access to the metadata (blueprints),
+which is loaded lazily from paths['interim'] or downloaded if missing.
+Compare against a previous checkout by running it from there.
+
+Usage:
+    python tests/benchmarks/bench_import.py [runs]
+'''
+
+import sys
+from subprocess import run
+from timeit import default_timer
+from statistics import median
+
+STATEMENTS = {
+    'python': 'pass',
+    'import': 'import scdata',
+    'import + metadata': 'import scdata; from scdata._config import config; config.blueprints'
+}
+
+def timed(statement):
+    start = default_timer()
+    run([sys.executable, '-c', statement], check = True, capture_output = True)
+    return default_timer() - start
+
+if __name__ == '__main__':
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    print(f'{"statement":>18} {"median (s)":>11} {"min (s)":>8}')
+    for name, statement in STATEMENTS.items():
+        # First run warms up the disk cache and creates the folders
+        timed(statement)
+        times = [timed(statement) for _ in range(runs)]
+        print(f'{name:>18} {median(times):>11.3f} {min(times):>8.3f}')
@@ -0,0 +1,66 @@
+'''
+Benchmark of the readings payload of ScApiDevice.post_data_to_device:
+previous row by row builder with json.dumps vs. the column-wise builder
+with the fast encoder (orjson if installed). 30 days of 1-minute data
+for 10 sensors with some NaN, in chunks of 500 rows.
+
+Usage:
+    python tests/benchmarks/bench_post_payload.py
+'''
+
+from timeit import default_timer
+from json import dumps, loads
+from math import isnan
+from numpy import nan
+from numpy.random import default_rng
+from pandas import DataFrame, date_range
+from scdata.utils import localise_date
+from scdata.io.device_api import ScApiDevice, fast_dumps
+
+PERIOD = ('2021-01-01', '2021-01-30 23:59')
+FREQUENCY = '1Min'
+N_SENSORS = 10
+CHUNK_SIZE = 500
+
+def make_readings(seed = 0):
+    rng = default_rng(seed)
+    index = date_range(*PERIOD, freq = FREQUENCY, tz = 'Europe/Madrid', name = 'recorded_at')
+    values = rng.random((len(index), N_SENSORS))
+    values[rng.random(values.shape) < 0.1] = nan
+    return DataFrame(values, index = index, columns = [100 + i for i in range(N_SENSORS)])
+
+def loop_payload(chunk):
+    # Previous implementation
+    payload = {"data":[]}
+    for item in chunk.index:
+        payload["data"].append(
+            {
+                "recorded_at": localise_date(item, 'UTC').strftime('%Y-%m-%dT%H:%M:%SZ'),
+                "sensors": [{
+                    "id": column,
+                    "value": chunk.loc[item, column]
+                } for column in chunk.columns if not isnan(chunk.loc[item, column])]
+            }
+        )
+    return dumps(payload)
+
+def vectorised_payload(chunk):
+    return fast_dumps(ScApiDevice.__readings_payload__(chunk))
+
+def timed(function, chunks):
+    start = default_timer()
+    result = [function(chunk) for chunk in chunks]
+    return result, default_timer() - start
+
+if __name__ == '__main__':
+    df = make_readings()
+    chunks = [df[i:i+CHUNK_SIZE] for i in range(0, df.shape[0], CHUNK_SIZE)]
+
+    old, t_old = timed(loop_payload, chunks)
+    new, t_new = timed(vectorised_payload, chunks)
+    for o, n in zip(old, new): assert loads(o) == loads(n)
+
+    print(f'{"builder":>11} {"time (s)":>9} {"rows/s":>10}')
+    print(f'{"loop":>11} {t_old:>9.3f} {len(df)/t_old:>10.0f}')
+    print(f'{"vectorised":>11} {t_new:>9.3f} {len(df)/t_new:>10.0f}')
+    print(f'speedup: {t_old/t_new:.1f}x')
@@ -0,0 +1,18 @@
+import pytest
+import sys
+from subprocess import run
+
+# Plotting, mapping, web and reporting packages, only loaded when they are used
+HEAVY = ['matplotlib', 'seaborn', 'plotly', 'folium', 'branca', 'jinja2', 'flask',
+         'IPython', 'sklearn', 'joblib', 'reportlab', 'pdfrw', 'tzwhere']
+
+def loaded_modules(statement):
+    # New interpreter, so that modules loaded by other tests do not count
+    result = run([sys.executable, '-c', f'{statement}\nimport sys\nprint(" ".join(sys.modules))'],
+                 capture_output = True, text = True, check = True)
+    return set(module.split('.')[0] for module in result.stdout.splitlines()[-1].split())
+
+@pytest.mark.parametrize('statement', ['from scdata import Device', 'from scdata import Test'])
+def test_no_heavy_imports(statement):
+    loaded = loaded_modules(statement)
+    assert not loaded.intersection(HEAVY), f'{statement} loads {sorted(loaded.intersection(HEAVY))}'
@@ -0,0 +1,56 @@
+import pytest
+from os import listdir
+from os.path import exists, join
+from numpy import arange
+from pandas import DataFrame, date_range, to_datetime
+from scdata.io.device_api import ScApiDevice
+
+@pytest.fixture
+def device(monkeypatch):
+    device = ScApiDevice(1234)
+    device.sensors = {10: 'TEMP', 20: 'HUM'}
+    device.timezone = 'UTC'
+    device.added_at = '2023-01-01T00:00:00Z'
+    device.last_reading_at = '2023-01-04T00:00:00Z'
+    device.kit_id = 26
+
+    # Metadata is not requested
+    monkeypatch.setattr(device, 'get_device_json', lambda update = False: dict())
+    for getter in ['get_device_sensors', 'get_device_timezone', 'get_device_last_reading',
+                   'get_device_added_at', 'get_kit_ID']:
+        monkeypatch.setattr(device, getter, lambda update = False: None)
+    return device
+
+@pytest.fixture
+def requests(device, monkeypatch):
+    # Windows (start dates) requested for each sensor. Fails the windows in requests.fail
+    class Requests(list): fail = set()
+    requests = Requests()
+
+    def get_sensor_data(sensor_id, min_date, max_date, rollup, frequency = '1Min', headers = None):
+        requests.append((sensor_id, min_date))
+        if min_date in requests.fail: return None
+        index = date_range(min_date, max_date, freq = '1H', tz = 'UTC', inclusive = 'left')
+        return DataFrame({device.sensors[sensor_id]: arange(len(index), dtype = float)}, index = index)
+
+    monkeypatch.setattr(device, 'get_sensor_data', get_sensor_data)
+    return requests
+
+def test_window_resume(device, requests, tmp_path):
+    path = join(tmp_path, f'{device.id}_windows')
+    windows = ['2023-01-01T00:00:00', '2023-01-02T00:00:00', '2023-01-03T00:00:00']
+
+    # Interrupted after the first window: only that one is kept
+    requests.fail = set(windows[1:])
+    device.get_device_data(frequency = '1H', window = '1D', window_path = str(tmp_path))
+    assert len(requests) == 6
+    assert listdir(path) == [f'{ScApiDevice.__window_name__((windows[0], windows[1]))}.csv']
+
+    # Rerun: only the missing windows are requested, and the folder is removed
+    requests.clear(); requests.fail = set()
+    df = device.get_device_data(frequency = '1H', window = '1D', window_path = str(tmp_path))
+    assert sorted(requests) == sorted([(sensor, window) for sensor in device.sensors for window in windows[1:]])
+    assert not exists(path)
+
+    assert list(df.columns) == ['HUM', 'TEMP']
+    assert len(df) == 72 and df.index[0] == to_datetime(windows[0]).tz_localize('UTC')
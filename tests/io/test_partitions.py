@@ -0,0 +1,38 @@
+import pytest
+from os import listdir
+from os.path import join
+from numpy import arange
+from pandas import DataFrame, date_range
+from scdata.io import export_partitioned_file, read_partitioned_file
+
+LOCATION = 'Europe/Madrid'
+
+def readings(value = 0):
+    # Four days, hourly
+    index = date_range('2023-03-01', periods = 96, freq = '1H', tz = LOCATION, name = 'TIME')
+    return DataFrame({'TEMP': arange(96, dtype = float) + value}, index = index)
+
+@pytest.mark.parametrize('file_format', ['csv', 'parquet'])
+def test_partitions(tmp_path, file_format):
+    df = readings()
+    assert export_partitioned_file(tmp_path, 'device', df, partition = 'D', file_format = file_format)
+    assert sorted(listdir(join(tmp_path, 'device'))) == \
+        [f'2023-03-0{day}.{file_format}' for day in range(1, 5)]
+
+    # Only the partitions from min_date on are written again
+    assert export_partitioned_file(tmp_path, 'device', readings(100), partition = 'D',
+                                   file_format = file_format, min_date = '2023-03-03 12:00')
+
+    result = read_partitioned_file(join(tmp_path, 'device'), LOCATION, '1H', index_name = 'TIME', partition = 'D')
+    assert result.index.equals(df.index)
+    assert (result['TEMP'][:'2023-03-02'] == df['TEMP'][:'2023-03-02']).all()
+    assert (result['TEMP']['2023-03-03':] == df['TEMP']['2023-03-03':] + 100).all()
+
+    # Reading only the partitions that overlap the dates
+    result = read_partitioned_file(join(tmp_path, 'device'), LOCATION, '1H', index_name = 'TIME', partition = 'D',
+                                   min_date = '2023-03-02 06:00', max_date = '2023-03-02 18:00')
+    assert result.index[0] == df.index[24] and result.index[-1] == df.index[47]
+
+    with pytest.raises(FileNotFoundError):
+        read_partitioned_file(join(tmp_path, 'device'), LOCATION, '1H', index_name = 'TIME', partition = 'D',
+                              min_date = '2023-04-01')
@@ -0,0 +1,73 @@
+import pytest
+from time import time
+from json import loads, dump, load
+from numpy import arange
+from pandas import DataFrame, date_range
+from scdata._config import config
+import scdata.io.device_api as device_api
+from scdata.io.device_api import ScApiDevice
+
+class Response:
+    def __init__(self, status_code): self.status_code = status_code
+
+@pytest.fixture
+def device(tmp_path, monkeypatch):
+    monkeypatch.setitem(config.paths, 'data', str(tmp_path))
+    monkeypatch.setenv('SC_BEARER', 'bearer')
+    monkeypatch.delenv('SC_ADMIN_BEARER', raising = False)
+    # One chunk at a time, so that the failed chunk is always the same
+    monkeypatch.setattr(config, '_max_concurrent_posts', 1)
+    return ScApiDevice(1234)
+
+@pytest.fixture
+def posts(monkeypatch):
+    # Timestamps of the first reading of each chunk posted. Fails the ones in posts.fail
+    class Posts(list): fail = set()
+    posts = Posts()
+
+    def retry_post(url, data, headers):
+        first = loads(data)['data'][0]['recorded_at']
+        if first in posts.fail: return Response(500)
+        posts.append(first)
+        return Response(200)
+
+    monkeypatch.setattr(device_api, 'retry_post', retry_post)
+    return posts
+
+def readings(periods = 50):
+    return DataFrame({'10': arange(periods, dtype = float)},
+                     index = date_range('2023-01-01', periods = periods, freq = '1min', tz = 'UTC'))
+
+def test_post_resume(device, posts):
+    df = readings()
+    starts = [f'{date:%Y-%m-%dT%H:%M:%SZ}' for date in df.index[::10]]
+
+    # Third chunk fails: only the chunks before it count as posted
+    posts.fail = {starts[2]}
+    assert device.post_data_to_device(df, chunk_size = 10) is False
+    assert posts[:2] == starts[:2] and starts[2] not in posts
+    with open(device.__post_record_path__(), 'r') as file:
+        assert load(file)['last_posted'] == df.index[19].isoformat()
+
+    # A dry run does not change the record
+    assert device.post_data_to_device(readings(60), chunk_size = 10, dry_run = True)
+    assert device.__load_post_record__() is not None
+
+    # Run again, with newer data: only the remaining chunks are posted
+    posts.clear(); posts.fail = set()
+    assert device.post_data_to_device(readings(60), chunk_size = 10) is True
+    assert posts[0] == starts[2] and len(posts) == 4
+    assert device.__load_post_record__() is None
+
+def test_post_record_stale(device, posts, monkeypatch):
+    df = readings()
+
+    posts.fail = {f'{df.index[20]:%Y-%m-%dT%H:%M:%SZ}'}
+    assert device.post_data_to_device(df, chunk_size = 10) is False
+
+    # Too old to resume: everything is posted again
+    monkeypatch.setattr(config, '_post_record_ttl', 0)
+    posts.clear(); posts.fail = set()
+    assert device.post_data_to_device(df, chunk_size = 10) is True
+    assert len(posts) == 5
+    assert device.__load_post_record__() is None
@@ -0,0 +1,32 @@
+import pytest
+from numpy import nan, linspace
+from pandas import Series
+from pandas.testing import assert_series_equal
+from scdata._config import config
+from scdata.device.process.alphasense import comp_t
+
+def comp_t_rowwise(t, comp_lut):
+# Previous row by row implementation, as reference
+    if t != t: return None
+
+    if t < config._as_t_comp[0]: return comp_lut[0]
+    if t > config._as_t_comp[-1]: return comp_lut[-1]
+
+    idx_2 = next(axis[0] for axis in enumerate(config._as_t_comp) if axis[1] > t)
+    idx_1 = idx_2 - 1
+
+    delta_y = comp_lut[idx_2] - comp_lut[idx_1]
+    delta_x = config._as_t_comp[idx_2] - config._as_t_comp[idx_1]
+
+    return comp_lut[idx_1] + (t - config._as_t_comp[idx_1]) * delta_y / delta_x
+
+@pytest.mark.parametrize('as_type', config._as_sensor_algs.keys())
+def test_comp_t(as_type):
+    # Includes temperatures below and over the table and NaN.
+    # The row by row version failed exactly on the last point, so it is left out
+    t = Series(list(linspace(-45, 49.9, 500)) + [nan, 51, 80, -30, 0, 20])
+
+    for algorithm in config._as_sensor_algs[as_type]:
+        comp_lut = config._as_sensor_algs[as_type][algorithm][1]
+        expected = t.apply(lambda x: comp_t_rowwise(x, comp_lut)).astype(float)
+        assert_series_equal(comp_t(t, comp_lut), expected)
@@ -0,0 +1,42 @@
+import pytest
+from numpy import nan
+from pandas import DataFrame
+from scdata.utils import GeoIndex
+import scdata.io.device_api as device_api
+from scdata.io.device_api import DadesObertesApiDevice, ScApiDevice
+
+STATIONS = DataFrame({'latitude': [41.38, 41.40, nan], 'longitude': [2.17, 2.20, nan]},
+                     index = ['A', 'B', 'C'])
+
+def test_geo_index():
+    index = GeoIndex(STATIONS)
+
+    assert list(index.within(41.38, 2.17, 1000).index) == ['A']
+    assert list(index.nearest(41.40, 2.19, k = 5).index) == ['B', 'A']
+
+@pytest.mark.parametrize('df', [STATIONS.iloc[:0], STATIONS.iloc[2:]])
+def test_geo_index_empty(df):
+    # No rows, or no rows with valid coordinates
+    index = GeoIndex(df)
+
+    assert index.within(41.38, 2.17, 1000).empty
+    assert index.nearest(41.38, 2.17).empty
+    assert index.bbox(41, 2, 42, 3).empty
+
+def test_world_map_empty(monkeypatch):
+    # An empty response from the API is a failure, as the other ones
+    monkeypatch.setattr(device_api, '_world_maps', dict())
+    monkeypatch.setattr(DadesObertesApiDevice, '__get_csv_pages__',
+                        staticmethod(lambda request, order = ':id': DataFrame()))
+
+    assert DadesObertesApiDevice.get_world_map_index(update = True) == (None, None)
+    assert DadesObertesApiDevice.get_world_map() is None
+    assert DadesObertesApiDevice.get_nearest_stations(41.38, 2.17) is None
+
+    class EmptyResponse:
+        status_code = 200
+        def json(self): return []
+
+    monkeypatch.setattr(device_api, 'retry_get', lambda url, **kwargs: EmptyResponse())
+    assert ScApiDevice.get_world_map_index(update = True) == (None, None)
+    assert ScApiDevice.get_world_map() is None